@@ -1,10 +1,17 @@
 # (c) 2019-2020 Mikhail Paulyshka
 # SPDX-License-Identifier: MIT
 
-from .mglx_http import MglxHttp
+from .mglx_circuitbreaker import MglxCircuitBreaker
+from .mglx_http import MglxHttp, MglxHttpResponse
+from .mglx_jsonstream import MglxJsonArrayStream
+from .mglx_ratelimiter import MglxTokenBucket
 from .mglx_webserver import MglxWebserver
 
 __all__ = (
-    'MglxHttp'
-    'MglxWebserver'
+    'MglxCircuitBreaker',
+    'MglxHttp',
+    'MglxHttpResponse',
+    'MglxJsonArrayStream',
+    'MglxTokenBucket',
+    'MglxWebserver',
 )
@@ -0,0 +1,77 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import time
+
+class MglxCircuitBreaker:
+    '''
+    Circuit breaker
+
+    Opens after `failure_threshold` consecutive failures and rejects requests for `reset_timeout` seconds,
+    after that single probe request is allowed (half-open state) to check if backend is recovered
+    '''
+
+    STATE_CLOSED = 'closed'
+    STATE_OPEN = 'open'
+    STATE_HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.__failure_threshold = max(1, failure_threshold)
+        self.__reset_timeout = reset_timeout
+
+        self.__state = self.STATE_CLOSED
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__probe_in_flight = False
+
+    def get_state(self) -> str:
+        return self.__state
+
+    def is_open(self) -> bool:
+        '''
+        returns True if requests will be rejected right now
+        '''
+        if self.__state == self.STATE_OPEN:
+            return time.monotonic() - self.__opened_at < self.__reset_timeout
+
+        if self.__state == self.STATE_HALF_OPEN:
+            return self.__probe_in_flight
+
+        return False
+
+    def allow_request(self) -> bool:
+        '''
+        checks if request can be performed, switches to half-open state and reserves probe if reset timeout is passed
+        '''
+        if self.__state == self.STATE_CLOSED:
+            return True
+
+        if self.__state == self.STATE_OPEN:
+            if time.monotonic() - self.__opened_at < self.__reset_timeout:
+                return False
+            self.__state = self.STATE_HALF_OPEN
+
+        if self.__probe_in_flight:
+            return False
+
+        self.__probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.__state = self.STATE_CLOSED
+        self.__failures = 0
+        self.__probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.__probe_in_flight = False
+        self.__failures += 1
+
+        if self.__state == self.STATE_HALF_OPEN or self.__failures >= self.__failure_threshold:
+            self.__state = self.STATE_OPEN
+            self.__opened_at = time.monotonic()
+
+    def record_ignored(self) -> None:
+        '''
+        releases reserved probe without changing state, e.g. when request was cancelled by client
+        '''
+        self.__probe_in_flight = False
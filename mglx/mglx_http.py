@@ -5,13 +5,27 @@ import asyncio
 import collections
 import logging
 import ssl
-from typing import Any, Dict
+import time
+from typing import Any, Callable, Dict
+from urllib.parse import urlparse
 
 import aiohttp
 import certifi
 
+from .mglx_ratelimiter import MglxTokenBucket
+
+MglxHttpResponse = collections.namedtuple('MglxHttpResponse', ['status', 'text', 'headers'], defaults = (None,))
+
 class MglxHttp:
     HTTP_DEFAULT_USER_AGENT = 'mglx_http/1.0.2'
+
+    HTTP_CHUNK_SIZE = 64 * 1024
+
+    HEDGE_BUDGET = 0.05
+    HEDGE_PERCENTILE = 0.95
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_MAX_SAMPLES = 200
+    HEDGE_FAILED_STATUSES = [0, 408, 499]
     
     def __init__(self, user_agent = HTTP_DEFAULT_USER_AGENT, verify_ssl = True):
         self.__user_agent = user_agent
@@ -26,6 +40,12 @@ class MglxHttp:
         self.__session_headers = {'User-Agent': self.__user_agent}
         self.__session = aiohttp.ClientSession(connector=self.__connector, headers = self.__session_headers)
 
+        self.__rate_limiters = dict()
+
+        self.__latencies = dict()
+        self.__requests_total = 0
+        self.__requests_hedged = 0
+
 
     async def shutdown(self):
         await self.__session.close()
@@ -36,19 +56,127 @@ class MglxHttp:
         '''
         self.__session_headers.update(headers)
 
+    #
+    # Rate limiting
+    #
+
+    def set_rate_limit(self, host: str, rate: float, burst: int = 1) -> None:
+        '''
+        limits requests to the given host to `rate` requests per second with `burst` requests allowance
+        '''
+        self.__rate_limiters[host.lower()] = MglxTokenBucket(rate, burst)
+
+    async def __rate_limit(self, url: str) -> None:
+        if not self.__rate_limiters or not url:
+            return
 
-    async def request(self, method: str, url: str, *, params: Any = None, data: Any = None, json: Any = None):
+        limiter = self.__rate_limiters.get(urlparse(str(url)).hostname)
+        if limiter is not None:
+            await limiter.acquire()
+
+    #
+    # Hedging
+    #
+
+    def get_hedge_delay(self, url: str) -> float:
+        '''
+        returns observed latency percentile for the url host or None if there is not enough samples
+        '''
+        latencies = self.__latencies.get(urlparse(str(url)).hostname)
+        if latencies is None or len(latencies) < self.HEDGE_MIN_SAMPLES:
+            return None
+
+        latencies = sorted(latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.HEDGE_PERCENTILE))]
+
+    def __hedge_budget_available(self) -> bool:
+        return self.__requests_hedged + 1 <= self.__requests_total * self.HEDGE_BUDGET
+
+    def __record_latency(self, url: str, latency: float) -> None:
+        host = urlparse(str(url)).hostname
+        if host not in self.__latencies:
+            self.__latencies[host] = collections.deque(maxlen=self.HEDGE_MAX_SAMPLES)
+
+        self.__latencies[host].append(latency)
+
+    async def __request_hedged(self, method: str, url: str, **kwargs) -> MglxHttpResponse:
+        '''
+        performs request and fires duplicate if the first one was not completed in observed latency percentile,
+        result of the first successfully completed request is used, other one is cancelled
+        '''
+        delay = self.get_hedge_delay(url)
+        if delay is None:
+            return await self.__request(method, url, **kwargs)
+
+        pending = {asyncio.ensure_future(self.__request(method, url, **kwargs))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout = delay)
+            if done or not self.__hedge_budget_available():
+                return await (done or pending).pop()
+
+            self.__requests_hedged += 1
+            self.__logger.info('request: [%s]%s --> hedged after %.3fs' % (method, url, delay))
+            pending.add(asyncio.ensure_future(self.__request(method, url, **kwargs)))
+
+            response = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+                for task in done:
+                    response = task.result()
+                    if response.status not in self.HEDGE_FAILED_STATUSES:
+                        return response
+
+            return response
+        finally:
+            for task in pending:
+                task.cancel()
+
+    #
+    # Requests
+    #
+
+    async def request(self, method: str, url: str, *, params: Any = None, data: Any = None, json: Any = None, headers: Dict = None, hedge: bool = False, chunk_handler: Callable[[bytes], None] = None):
+        '''
+        performs HTTP request
+
+        `headers` are sent in addition to session headers,
+        `hedge` enables hedging for GET requests,
+        `chunk_handler` receives body of successful response chunk by chunk instead of `text`, hedging is not applied in this case
+        '''
+        if hedge and method == 'GET' and chunk_handler is None:
+            return await self.__request_hedged(method, url, params = params, data = data, json = json, headers = headers)
+
+        return await self.__request(method, url, params = params, data = data, json = json, headers = headers, chunk_handler = chunk_handler)
+
+    async def __request(self, method: str, url: str, *, params: Any = None, data: Any = None, json: Any = None, headers: Dict = None, chunk_handler: Callable[[bytes], None] = None) -> MglxHttpResponse:
         response_status = None
         response_text = None
+        response_headers = None
+
+        self.__requests_total += 1
+        request_url = url
+        request_started = time.monotonic()
 
         if 'Referer' in self.__session_headers:
             self.__session_headers.pop('Referer')
     
         while True:
             try:
-                async with self.__session.request(method, url, headers = self.__session_headers, params = params, data = data, json = json) as response:
-                    response_text = await response.text()
+                await self.__rate_limit(url)
+                request_headers = self.__session_headers
+                if headers:
+                    request_headers = dict(self.__session_headers)
+                    request_headers.update(headers)
+
+                async with self.__session.request(method, url, headers = request_headers, params = params, data = data, json = json) as response:
                     response_status = response.status
+                    response_headers = response.headers
+                    if chunk_handler is not None and response_status == 200:
+                        async for chunk in response.content.iter_chunked(self.HTTP_CHUNK_SIZE):
+                            chunk_handler(chunk)
+                        break
+
+                    response_text = await response.text()
                     if response_status == 202 and 'Location' in response.headers:
                         url = response.headers['Location']
                         self.__session_headers.update({'Referer': str(response.url)})
@@ -76,10 +204,13 @@ class MglxHttp:
                 response_status = 408 #408 Request Timeout
                 break
 
-        return collections.namedtuple('MglxHttpResponse', ['status', 'text'])(response_status, response_text)
+        if response_status not in self.HEDGE_FAILED_STATUSES:
+            self.__record_latency(request_url, time.monotonic() - request_started)
+
+        return MglxHttpResponse(response_status, response_text, response_headers)
 
-    async def request_get(self, url: str, params: Any = None) -> Any:
-        return await self.request('GET', url, params = params)
+    async def request_get(self, url: str, params: Any = None, *, headers: Dict = None, hedge: bool = False, chunk_handler: Callable[[bytes], None] = None) -> Any:
+        return await self.request('GET', url, params = params, headers = headers, hedge = hedge, chunk_handler = chunk_handler)
 
     async def request_post(self, url: str, *, params: Any = None, data: Any = None, json: Any = None) -> Any:
         return await self.request('POST', url, params = params, data = data, json = json)
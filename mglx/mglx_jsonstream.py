@@ -0,0 +1,224 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import codecs
+import json
+from typing import Any, List
+
+class MglxJsonArrayStream:
+    '''
+    Incremental JSON parser which yields items of the array located by `path` as soon as they are received
+
+    Objects on the path are walked key by key, values of other keys are skipped.
+    Raw body is retained until the array is found, so it can be parsed as a whole if payload is not streamable.
+    Incomplete skipped value is decoded again on every chunk, so parsing fails when it exceeds `SKIP_MAX_SIZE`
+    and the raw body should be parsed as a whole then.
+    '''
+
+    STATE_VALUE = 0
+    STATE_KEY = 1
+    STATE_ITEMS = 2
+    STATE_COMPLETED = 3
+    STATE_FAILED = 4
+
+    WHITESPACE = ' \t\n\r'
+
+    SKIP_MAX_SIZE = 512 * 1024
+
+    def __init__(self, path: List[str]):
+        self.__path = list(path)
+        self.__depth = 0
+
+        self.__decoder = codecs.getincrementaldecoder('utf-8')()
+        self.__json = json.JSONDecoder()
+
+        self.__state = self.STATE_VALUE if self.__path else self.STATE_FAILED
+        self.__buffer = ''
+        self.__position = 0
+        self.__raw = list()
+
+    def is_completed(self) -> bool:
+        '''
+        returns True if the whole array was parsed
+        '''
+        return self.__state == self.STATE_COMPLETED
+
+    def is_streaming(self) -> bool:
+        '''
+        returns True if the array was found and items are parsed incrementally
+        '''
+        return self.__state in (self.STATE_ITEMS, self.STATE_COMPLETED)
+
+    def get_raw(self) -> bytes:
+        '''
+        returns retained raw body or None if it was already released
+        '''
+        if self.__raw is None:
+            return None
+
+        return b''.join(self.__raw)
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        '''
+        feeds next chunk of the body, returns parsed array items
+        '''
+        #raw body is needed for the fallback even if streaming parse has already failed
+        if self.__raw is not None:
+            self.__raw.append(chunk)
+
+        if self.__state in (self.STATE_COMPLETED, self.STATE_FAILED):
+            return list()
+
+        self.__buffer += self.__decoder.decode(chunk)
+        return self.__process(False)
+
+    def close(self) -> List[Any]:
+        '''
+        finalizes parsing, returns remaining array items
+        '''
+        result = list()
+
+        if self.__state not in (self.STATE_COMPLETED, self.STATE_FAILED):
+            try:
+                self.__buffer += self.__decoder.decode(b'', True)
+                result = self.__process(True)
+            except UnicodeDecodeError:
+                self.__fail()
+
+        if self.__state != self.STATE_COMPLETED:
+            self.__fail()
+
+        self.__buffer = ''
+        self.__position = 0
+        return result
+
+    #
+    # Internals
+    #
+
+    def __fail(self) -> None:
+        self.__state = self.STATE_FAILED
+
+    def __skip_whitespace(self) -> bool:
+        buffer = self.__buffer
+        position = self.__position
+        while position < len(buffer) and buffer[position] in self.WHITESPACE:
+            position += 1
+
+        self.__position = position
+        return position < len(buffer)
+
+    def __decode_value(self, final: bool):
+        '''
+        returns (True, value) if the complete value is available
+        '''
+        try:
+            value, end = self.__json.raw_decode(self.__buffer, self.__position)
+        except json.JSONDecodeError:
+            if final:
+                self.__fail()
+            return (False, None)
+
+        #value at the end of the buffer may be truncated (e.g. numbers)
+        if end >= len(self.__buffer) and not final:
+            return (False, None)
+
+        self.__position = end
+        return (True, value)
+
+    def __process(self, final: bool) -> List[Any]:
+        result = list()
+
+        while self.__state not in (self.STATE_COMPLETED, self.STATE_FAILED):
+            if not self.__skip_whitespace():
+                break
+
+            char = self.__buffer[self.__position]
+
+            if self.__state == self.STATE_VALUE:
+                if char != '{':
+                    self.__fail()
+                    break
+
+                self.__position += 1
+                self.__state = self.STATE_KEY
+
+            elif self.__state == self.STATE_KEY:
+                if char == ',':
+                    self.__position += 1
+                    continue
+
+                if char != '"':
+                    self.__fail()
+                    break
+
+                start = self.__position
+                (key_ready, key) = self.__decode_value(final)
+                if not key_ready or not self.__skip_whitespace():
+                    self.__position = start
+                    break
+
+                if self.__buffer[self.__position] != ':':
+                    self.__fail()
+                    break
+                self.__position += 1
+
+                if key != self.__path[self.__depth]:
+                    if not self.__skip_whitespace():
+                        self.__position = start
+                        break
+
+                    value_start = self.__position
+                    (value_ready, _) = self.__decode_value(final)
+                    if not value_ready:
+                        if len(self.__buffer) - value_start > self.SKIP_MAX_SIZE:
+                            self.__fail()
+                            break
+
+                        self.__position = start
+                        break
+                    continue
+
+                self.__depth += 1
+                if self.__depth < len(self.__path):
+                    self.__state = self.STATE_VALUE
+                    continue
+
+                if not self.__skip_whitespace():
+                    self.__position = start
+                    self.__depth -= 1
+                    break
+
+                if self.__buffer[self.__position] != '[':
+                    self.__fail()
+                    break
+
+                self.__position += 1
+                self.__state = self.STATE_ITEMS
+                self.__raw = None
+
+            elif self.__state == self.STATE_ITEMS:
+                if char == ',':
+                    self.__position += 1
+                    continue
+
+                if char == ']':
+                    self.__position += 1
+                    self.__state = self.STATE_COMPLETED
+                    break
+
+                (item_ready, item) = self.__decode_value(final)
+                if not item_ready:
+                    break
+
+                result.append(item)
+
+        #release consumed data
+        if self.__state in (self.STATE_VALUE, self.STATE_KEY, self.STATE_ITEMS):
+            self.__buffer = self.__buffer[self.__position:]
+            self.__position = 0
+        elif self.__state == self.STATE_COMPLETED:
+            self.__buffer = ''
+            self.__position = 0
+
+        return result
@@ -0,0 +1,46 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import time
+
+class MglxTokenBucket:
+    '''
+    Token bucket rate limiter
+
+    Refills `rate` tokens per second up to `burst` tokens, each request consumes one token
+    '''
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError('MglxTokenBucket: rate must be positive')
+
+        self.__rate = float(rate)
+        self.__burst = float(max(1, burst))
+
+        self.__tokens = self.__burst
+        self.__timestamp = time.monotonic()
+
+    def try_acquire(self) -> bool:
+        '''
+        consumes one token if available
+        '''
+        self.__refill()
+
+        if self.__tokens < 1.0:
+            return False
+
+        self.__tokens -= 1.0
+        return True
+
+    async def acquire(self) -> None:
+        '''
+        waits until the token is available and consumes it
+        '''
+        while not self.try_acquire():
+            await asyncio.sleep((1.0 - self.__tokens) / self.__rate)
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.__tokens = min(self.__burst, self.__tokens + (now - self.__timestamp) * self.__rate)
+        self.__timestamp = now
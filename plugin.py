@@ -58,7 +58,7 @@ import webbrowser
 
 from galaxyutils.time_tracker import TimeTracker, GameNotTrackedException, GamesStillBeingTrackedException
 
-from wgc import WGC, WgcLauncher, WGCLocalApplication, PAPIWoT, WgcXMPP, get_profile_url
+from wgc import WGC, WgcCatalog, WgcFsWatcher, WgcLauncher, WGCLocalApplication, WgcProcessHandle, WgcProcessIndex, WgcProcessWatcher, PAPIWoT, WgcXMPP, get_profile_url
 
 class WargamingPlugin(Plugin):
     """
@@ -86,6 +86,11 @@ class WargamingPlugin(Plugin):
     """
 
     SLEEP_CHECK_INSTANCES = 30
+    SLEEP_CHECK_RUNNING = 2
+    SLEEP_SYNC_OWNED_GAMES = 600
+
+    SIZE_MAX_WALKERS = 2
+    SIZE_TIMEOUT = 60
 
 
     def __init__(self, reader, writer, token):
@@ -103,8 +108,23 @@ class WargamingPlugin(Plugin):
         self.__gametime_tracker = None
 
         self.__task_check_for_instances_obj = None
-        self.__local_games_states = dict()
-        self.__local_applications = dict()
+        self.__task_check_running_obj = None
+        self.__process_watcher = WgcProcessWatcher()
+        self.__launched_games = dict()
+        self.__fs_watcher = WgcFsWatcher.create()
+
+        self.__size_max_walkers = self.SIZE_MAX_WALKERS
+        if 'size_max_walkers' in config:
+            self.__size_max_walkers = config['size_max_walkers']
+
+        self.__size_timeout = self.SIZE_TIMEOUT
+        if 'size_timeout' in config:
+            self.__size_timeout = config['size_timeout']
+        self.__catalog = WgcCatalog()
+
+        self.__task_sync_owned_games_obj = None
+        self.__owned_games = None
+        self.__owned_games_fingerprint = None
 
         self.__platform = get_platform()
 
@@ -173,10 +193,21 @@ class WargamingPlugin(Plugin):
             self._logger.error('plugin/get_owned_games: realm is None', exc_info=True)
             return owned_applications
 
-        for instance in (await self._wgc.get_owned_applications(realm)).values():
-            license_info = LicenseInfo(LicenseType.SinglePurchase if instance.is_application_purchased() else LicenseType.FreeToPlay, None)
-            owned_applications.append(Game(instance.get_application_id(), instance.get_application_fullname(), None, license_info))
+        owned_instances = await self._wgc.get_owned_applications(realm)
+
+        owned_games = dict()
+        for instance in owned_instances.values():
+            owned_games[instance.get_application_id()] = self.__get_owned_game(instance)
 
+        #metadata is used only by macOS installer, WGC downloads it by itself on Windows
+        if self.__platform == 'macos':
+            self._wgc.start_metadata_prefetch(owned_instances.values())
+
+        self.__catalog.update_owned(owned_instances)
+        self.__owned_games = owned_games
+        self.__owned_games_fingerprint = self._wgc.get_owned_applications_fingerprint(realm)
+
+        owned_applications.extend(owned_games.values())
         return owned_applications
 
     #
@@ -187,7 +218,7 @@ class WargamingPlugin(Plugin):
         self.__rescan_games(False)
 
         result = list()
-        for id, state in self.__local_games_states.items():
+        for id, state in self.__catalog.get_states().items():
             result.append(LocalGame(id,state)) 
 
         self.__localgames_imported = True
@@ -198,13 +229,25 @@ class WargamingPlugin(Plugin):
     #
 
     async def launch_game(self, game_id: str) -> None:
-        if game_id not in self.__local_applications:
+        local_application = self.__catalog.get_local(game_id)
+        if local_application is None:
             self._logger.warning('plugin/launch_game: failed to run game with id %s' % game_id)
             return
 
-        self.__local_applications[game_id].run_application(self.__platform)
+        handle = local_application.run_application(self.__platform)
+        if handle is None:
+            self._logger.warning('plugin/launch_game: failed to start game with id %s' % game_id)
+            return
+
         self.__change_game_status(game_id, LocalGameState.Installed | LocalGameState.Running, True)
 
+        #exit of the launched game is reported by its process handle
+        previous_task = self.__launched_games.get(game_id)
+        if previous_task is not None:
+            previous_task.cancel()
+        self.__process_watcher.add_handle(handle)
+        self.__launched_games[game_id] = self.create_task(self.__task_wait_for_exit(game_id, handle), "task_wait_for_exit")
+
     #
     # InstallGame
     #
@@ -214,20 +257,28 @@ class WargamingPlugin(Plugin):
             webbrowser.open(self._wgc.get_wgc_install_url())
             return
 
-        wgni = self._wgc.get_wgni_client()
-        instances = await self._wgc.get_owned_applications(wgni.get_account_realm())
-        if game_id not in instances:
+        instance = self.__catalog.get_owned(game_id)
+        if instance is None:
+            wgni = self._wgc.get_wgni_client()
+            instance = await self._wgc.get_owned_application(game_id, wgni.get_account_realm())
+
+        if instance is None:
             self._logger.warning('plugin/install_games: failed to find the application with id %s' % game_id)
             raise BackendError()
         
-        await instances[game_id].install_application()
+        await instance.install_application()
 
     #
     # UninstallGame
     #
 
     async def uninstall_game(self, game_id: str) -> None:
-        self.__local_applications[game_id].uninstall_application()
+        local_application = self.__catalog.get_local(game_id)
+        if local_application is None:
+            self._logger.warning('plugin/uninstall_game: failed to find local game with id %s' % game_id)
+            return
+
+        local_application.uninstall_application()
 
     #
     # LaunchPlatformClient
@@ -270,24 +321,12 @@ class WargamingPlugin(Plugin):
     #
 
     async def prepare_os_compatibility_context(self, game_ids: List[str]) -> Any:     
-        result = dict()
-
         game_restrictions = self._wgc.get_game_restrictions()
-        current_platform = get_platform()
+        self.__catalog.set_restrictions(get_platform(), game_restrictions.get_allowed_ids_set() if game_restrictions else frozenset())
 
+        result = dict()
         for game_id in game_ids:
-            #populate from local app
-            if game_id in self.__local_applications:
-                result[game_id] = self.__local_applications[game_id].GetOsCompatibility()
-                continue
-
-            #windows is supported in any way
-            result[game_id] = ['windows']
-
-            #populate from game restriction for non-windows platform
-            if current_platform != 'windows' and game_restrictions:
-                if game_id in game_restrictions.get_allowed_ids():
-                    result[game_id].append(current_platform)
+            result[game_id] = self.__catalog.get_compatibility(game_id)
 
         return result
 
@@ -336,10 +375,32 @@ class WargamingPlugin(Plugin):
     async def prepare_local_size_context(self, game_ids: List[str]) -> Any:
         ctx = dict()
 
+        semaphore = asyncio.Semaphore(self.__size_max_walkers)
+        async def get_size(game_id: str, local_application: WGCLocalApplication) -> None:
+            async with semaphore:
+                try:
+                    size = await asyncio.wait_for(local_application.get_app_size(self._wgc.get_size_calculator()), self.__size_timeout)
+                except asyncio.TimeoutError:
+                    #walker is cancelled, already scanned directories stay in the size cache
+                    self._logger.warning('plugin/prepare_local_size_context: timeout on size calculation for %s' % game_id)
+                    ctx[game_id] = None
+                    return
+
+            ctx[game_id] = size
+
+        tasks = list()
         for game_id in game_ids:
-            if game_id in self.__local_applications:
-                ctx[game_id] = await self.__local_applications[game_id].get_app_size()
+            local_application = self.__catalog.get_local(game_id)
+            if local_application is None:
+                continue
 
+            #size calculator rescans only directories which were changed since the previous call
+            tasks.append(get_size(game_id, local_application))
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+        self.__size_save_cache()
         return ctx
 
 
@@ -358,6 +419,9 @@ class WargamingPlugin(Plugin):
         gametime_cache = self.__gametime_load_cache()
         self.__gametime_tracker = TimeTracker(game_time_cache=gametime_cache) if gametime_cache is not None else TimeTracker()
 
+        #size cache initialization
+        self.__size_load_cache()
+
         self.__handshake_completed = True
 
     def tick(self):
@@ -365,7 +429,19 @@ class WargamingPlugin(Plugin):
             if not self.__task_check_for_instances_obj or self.__task_check_for_instances_obj.done():
                 self.__task_check_for_instances_obj = self.create_task(self.__task_check_for_instances(), "task_check_for_instances")
 
+            if not self.__task_check_running_obj or self.__task_check_running_obj.done():
+                self.__task_check_running_obj = self.create_task(self.__task_check_running(), "task_check_running")
+
+        if self.__handshake_completed and self.__owned_games is not None:
+            if not self.__task_sync_owned_games_obj or self.__task_sync_owned_games_obj.done():
+                self.__task_sync_owned_games_obj = self.create_task(self.__task_sync_owned_games(), "task_sync_owned_games")
+
     async def shutdown(self) -> None:
+        for task in self.__launched_games.values():
+            task.cancel()
+        self.__launched_games.clear()
+
+        self.__fs_watcher.close()
         await self._wgc.shutdown()
 
         #xmpp
@@ -375,40 +451,76 @@ class WargamingPlugin(Plugin):
         #time tracker
         self.__gametime_save_cache()
 
+        #size cache
+        self.__size_save_cache()
+
     #
     # Internals
     #
 
     async def __task_check_for_instances(self):
+        #rescan right after local applications files were changed, or periodically as fallback
+        changes = await self.__fs_watcher.get_changes(self.SLEEP_CHECK_INSTANCES)
+        if changes:
+            self._logger.info('plugin/__task_check_for_instances: changed %s' % changes)
+
         self.__rescan_games(True)
-        await asyncio.sleep(self.SLEEP_CHECK_INSTANCES)
+
+    async def __task_check_running(self):
+        if self.__process_watcher.poll():
+            self.__update_running_states(True)
+        await asyncio.sleep(self.SLEEP_CHECK_RUNNING)
+
+    async def __task_wait_for_exit(self, game_id: str, handle: WgcProcessHandle):
+        try:
+            await handle.wait()
+        finally:
+            self.__process_watcher.remove_handle(handle)
+        self.__launched_games.pop(game_id, None)
+
+        #game may still be running when it was started outside of the plugin too
+        self.__process_watcher.poll()
+        self.__update_running_states(True)
 
     def __rescan_games(self, notify = False):
-        self.__local_applications = self._wgc.get_local_applications()
+        local_applications = self._wgc.get_local_applications()
 
         #delete uninstalled games
-        for game_id in self.__local_games_states:
-            if game_id not in self.__local_applications:
-                self.__change_game_status(game_id, LocalGameState.None_, notify)
+        for game_id in self.__catalog.update_local(local_applications):
+            self.__change_game_status(game_id, LocalGameState.None_, notify)
+
+        #full process check, the short interval task inspects only new processes
+        process_names = set()
+        for game in local_applications.values():
+            process_names.update(WgcProcessIndex.get_process_names(game.GetExecutablePaths()))
+        self.__process_watcher.set_names(process_names)
+        self.__process_watcher.poll(True)
+
+        self.__update_running_states(notify)
+
+        self.__fs_watcher.set_paths(self._wgc.get_local_applications_paths())
+
+    def __update_running_states(self, notify: bool) -> None:
+        process_index = self.__process_watcher.get_index()
 
         #change status of installed games
-        for game_id, game in self.__local_applications.items():
+        for game_id, game in self.__catalog.get_local_applications().items():
+            #state of the games launched by plugin is maintained by their process handles
+            if game_id in self.__launched_games:
+                continue
+
             new_state = LocalGameState.None_
-            if game.is_running():
+            if game.is_running(process_index):
                 new_state = LocalGameState.Installed | LocalGameState.Running
             elif game.IsInstalled():
                 new_state = LocalGameState.Installed
 
-            status_changed = False
-            if game_id not in self.__local_games_states or new_state != self.__local_games_states[game_id]:
-                status_changed = True
-
-            if status_changed:
+            if new_state != self.__catalog.get_state(game_id):
                 self.__change_game_status(game_id, new_state, notify)
 
 
     def __change_game_status(self, game_id: str, new_state: LocalGameState, notify: bool) -> None:
-        self.__local_games_states[game_id] = new_state
+        self.__catalog.set_state(game_id, new_state)
 
         if notify:
             #notify gametime tracker
@@ -423,6 +535,66 @@ class WargamingPlugin(Plugin):
             #notify GLX client
             self.update_local_game_status(LocalGame(game_id, new_state))
 
+    #
+    # Internals/Owned games
+    #
+
+    def __get_owned_game(self, instance) -> Game:
+        license_info = LicenseInfo(LicenseType.SinglePurchase if instance.is_application_purchased() else LicenseType.FreeToPlay, None)
+        return Game(instance.get_application_id(), instance.get_application_fullname(), None, license_info)
+
+    async def __task_sync_owned_games(self):
+        await asyncio.sleep(self.SLEEP_SYNC_OWNED_GAMES)
+        await self.__sync_owned_games()
+
+    async def __sync_owned_games(self) -> None:
+        '''
+        refreshes owned games and notifies GLX client about changes only
+        '''
+        realm = self._wgc.get_wgni_client().get_account_realm()
+        if realm is None:
+            return
+
+        self._wgc.invalidate_owned_applications(realm)
+        instances = await self._wgc.get_owned_applications(realm)
+        if not instances:
+            self._logger.warning('plugin/__sync_owned_games: empty product list, skipping')
+            return
+
+        #backend data was not changed
+        fingerprint = self._wgc.get_owned_applications_fingerprint(realm)
+        if fingerprint is not None and fingerprint == self.__owned_games_fingerprint:
+            return
+
+        owned_games = dict()
+        for game_id, instance in instances.items():
+            old_game = self.__owned_games.get(game_id)
+            new_game = self.__get_owned_game(instance)
+
+            if old_game is None:
+                self.add_game(new_game)
+            elif old_game.game_title != new_game.game_title or old_game.license_info != new_game.license_info:
+                self.update_game(new_game)
+            else:
+                new_game = old_game
+
+            owned_games[game_id] = new_game
+
+        for game_id, old_game in self.__owned_games.items():
+            if game_id in owned_games:
+                continue
+
+            #product list is incomplete (e.g. transient errors), missing games may be still owned
+            if fingerprint is None:
+                owned_games[game_id] = old_game
+                continue
+
+            self.remove_game(game_id)
+
+        self.__catalog.update_owned(instances)
+        self.__owned_games = owned_games
+        self.__owned_games_fingerprint = fingerprint
+
     #
     # Internals/XMPP
     #
@@ -513,6 +685,27 @@ class WargamingPlugin(Plugin):
             self.persistent_cache["gametime_cache"] = gametime_cache
             self.push_cache()
 
+    #
+    # Internals/Size
+    #
+
+    def __size_load_cache(self) -> None:
+        if "size_cache" not in self.persistent_cache:
+            return
+
+        try:
+            self._wgc.get_size_calculator().set_cache_data(json.loads(self.persistent_cache["size_cache"]))
+        except ValueError:
+            self._logger.warning('plugin/__size_load_cache: failed to load size cache')
+
+    def __size_save_cache(self) -> None:
+        size_calculator = self._wgc.get_size_calculator()
+        if not size_calculator.is_cache_modified():
+            return
+
+        self.persistent_cache["size_cache"] = json.dumps(size_calculator.get_cache_data())
+        self.push_cache()
+
 
 def main():
     create_and_run_plugin(WargamingPlugin, sys.argv)
@@ -4,22 +4,30 @@
 from .wgc import WGC
 from .wgc_application_local import WGCLocalApplication
 from .wgc_apptype import WgcAppType
+from .wgc_catalog import WgcCatalog
+from .wgc_fswatcher import WgcFsWatcher
 from .wgc_helper import get_profile_url
 from .wgc_launcher import WgcLauncher
+from .wgc_processes import WgcProcessHandle, WgcProcessIndex, WgcProcessWatcher
 from .wgc_xmpp import WgcXMPP
 
 from .papi_wgnet import PAPIWgnet
 from .papi_wot import PAPIWoT
 
 __all__ = (
-    'WGC'
-    'WgcAppType'
-    'WgcLauncher'
-    'WGCLocalApplication'
-    'WgcXMPP'
+    'WGC',
+    'WgcAppType',
+    'WgcCatalog',
+    'WgcFsWatcher',
+    'WgcLauncher',
+    'WGCLocalApplication',
+    'WgcProcessHandle',
+    'WgcProcessIndex',
+    'WgcProcessWatcher',
+    'WgcXMPP',
 
-    'get_profile_url'
+    'get_profile_url',
 
-    'PAPIWgnet'
-    'PAPIWoT'
+    'PAPIWgnet',
+    'PAPIWoT',
 )
\ No newline at end of file
@@ -1,27 +1,36 @@
 # (c) 2019-2020 Mikhail Paulyshka
 # SPDX-License-Identifier: MIT
 
+import asyncio
 import logging
 import os
 import subprocess
-from typing import Dict
+import tempfile
+from typing import Dict, Iterable, List
 import xml.etree.ElementTree as ElementTree
 
 from .wgc_api import WgcApi
 from .wgc_authserver import WgcAuthServer
 from .wgc_application_local import WGCLocalApplication
-from .wgc_application_owned import WGCOwnedApplication, WGCOwnedApplicationInstance
-from .wgc_constants import FALLBACK_COUNTRY, FALLBACK_LANGUAGE, WGCInstallDocs
+from .wgc_application_owned import WGCOwnedApplication, WGCOwnedApplicationIndex, WGCOwnedApplicationInstance
+from .wgc_constants import FALLBACK_COUNTRY, FALLBACK_LANGUAGE, WGCInstallDocs, WGCRealms
 from .wgc_error import MetadataNotFoundError, MetadataParseError
 from .wgc_gamerestrictions import WGCGameRestrictions
 from .wgc_helper import DETACHED_PROCESS
 from .wgc_http import WgcHttp
 from .wgc_location import WGCLocation
+from .wgc_metadatacache import WgcMetadataCache
+from .wgc_prefetcher import WgcMetadataPrefetcher
 from .wgc_preferences import WgcPreferences
+from .wgc_size import WgcSizeCalculator
 from .wgc_wgni import WgcWgni
+from .wgc_xmlcache import XML_CACHE
 from .wgc_xmpp import WgcXMPP
 
 class WGC():
+
+    OWNED_APPLICATIONS_TTL = 600
+
     def __init__(self, config : Dict):
         self.__logger = logging.getLogger('wgc')    
 
@@ -30,15 +39,52 @@ class WGC():
         if 'ssl_verify' in config:
             ssl_verify = config['ssl_verify']
 
-        self.__http = WgcHttp(ssl_verify)
+        rate_limits = None
+        if 'http_rate_limits' in config:
+            rate_limits = config['http_rate_limits']
+
+        #additional realms which are queried for free-to-play applications, `true` means all realms,
+        #purchases are fetched for the account realm only, because login session is not valid for other realms
+        self.__catalog_realms = list()
+        if 'catalog_realms' in config:
+            if config['catalog_realms'] is True:
+                self.__catalog_realms = list(WGCRealms.keys())
+            elif config['catalog_realms']:
+                self.__catalog_realms = [realm.upper() for realm in config['catalog_realms'] if realm.upper() in WGCRealms]
+
+        self.__http = WgcHttp(ssl_verify, rate_limits)
         self.__wgni = WgcWgni(self.__http, self.get_tracking_id())
         self.__authserver = WgcAuthServer(self.__wgni)
 
+        metadata_cache_dir = os.path.join(tempfile.gettempdir(), 'galaxy-integration-wargaming', 'metadata')
+        if 'metadata_cache_dir' in config:
+            metadata_cache_dir = config['metadata_cache_dir']
+        self.__metadata_cache = WgcMetadataCache(metadata_cache_dir)
+
         preferences = WgcPreferences(WGCLocation.get_wgc_preferences_file())
-        self.__api = WgcApi(self.__http, self.__wgni, preferences.get_country_code(), preferences.get_wgc_language())
+        self.__api = WgcApi(self.__http, self.__wgni, preferences.get_country_code(), preferences.get_wgc_language(), self.__metadata_cache)
+
+        #identity map of local applications by folder: folder -> (signature, application)
+        self.__local_applications = dict()
+
+        self.__owned_indexes = dict()
+        self.__owned_tasks = dict()
+        #target realm -> (fingerprint, index) of the last built index, it is kept on invalidation
+        self.__owned_fingerprints = dict()
+        self.__metadata_prefetcher = WgcMetadataPrefetcher(self.__api)
+        self.__size_calculator = WgcSizeCalculator()
+
+        #start catalog fetch right after login, so it overlaps with the rest of the handshake
+        self.__wgni.add_login_handler(self.__on_login)
 
 
     async def shutdown(self):
+        for task in self.__owned_tasks.values():
+            task.cancel()
+
+        await self.__metadata_prefetcher.shutdown()
+        self.__size_calculator.shutdown()
+        self.__logger.info('WGC/shutdown: XML cache stats %s' % XML_CACHE.get_stats())
         await self.__api.shutdown()
         await self.__authserver.shutdown()
         await self.__wgni.shutdown()
@@ -79,42 +125,217 @@ class WGC():
 
     # Applications
 
+    def get_size_calculator(self) -> WgcSizeCalculator:
+        return self.__size_calculator
+
     def get_local_applications(self) -> Dict[str, WGCLocalApplication]:
+        '''
+        returns local applications, XML files are parsed again only for folders with changed stat signature
+        '''
         apps = dict()
+        local_applications = dict()
 
         for app_dir in WGCLocation.get_apps_dirs():
             #skip missing directories
             if not os.path.exists(app_dir):
                 continue
-            
-            try:
-                app = WGCLocalApplication(app_dir)
+
+            signature = WGCLocalApplication.get_signature(app_dir)
+            cached = self.__local_applications.get(app_dir)
+            if cached is not None and cached[0] == signature:
+                app = cached[1]
+            else:
+                app = self.__load_local_application(app_dir)
+
+            #game_info.xml is rewritten on game update, files may be changed without directory mtime change,
+            #signature is persisted with size cache, so updates made while the plugin was not running are detected too
+            self.__size_calculator.set_root_signature(app_dir, signature)
+
+            #failed folders are remembered too, so they are not parsed again until changed
+            local_applications[app_dir] = (signature, app)
+            if app is not None:
                 apps[app.get_app_id()] = app
-            except MetadataNotFoundError:
-                self.__logger.warning('WGC/get_local_applications: Failed to found game metadata from folder %s. ' % app_dir)
-            except MetadataParseError:
-                self.__logger.warning('WGC/get_local_applications: Failed to parse metadata in folder %s. ' % app_dir)
-            except PermissionError:
-                self.__logger.warning('WGC/get_local_applications: Failed to get accces to the folder %s. ' % app_dir)
-            except Exception:
-                self.__logger.exception('WGC/get_local_applications: Failed to load game metadata from folder %s. ' % app_dir)
 
+        for app_dir in self.__local_applications:
+            if app_dir not in local_applications:
+                self.__size_calculator.invalidate(app_dir)
+
+        self.__local_applications = local_applications
         return apps
 
+    def get_local_applications_paths(self) -> List[str]:
+        '''
+        returns paths which should be watched to detect changes of local applications
+        '''
+        paths = list()
+
+        apps_dir = WGCLocation.get_wgc_apps_dir()
+        if os.path.isdir(apps_dir):
+            paths.append(apps_dir)
+            try:
+                paths.extend([entry.path for entry in os.scandir(apps_dir) if entry.is_dir()])
+            except OSError:
+                self.__logger.warning('WGC/get_local_applications_paths: failed to scan %s' % apps_dir)
+
+        for app_dir in self.__local_applications:
+            paths.append(os.path.join(app_dir, WGCLocalApplication.INFO_FILE))
+            paths.append(os.path.join(app_dir, WGCLocalApplication.METADATA_FILE))
+
+        return paths
+
     async def get_owned_applications(self, target_realm: str = None) -> Dict[str, WGCOwnedApplicationInstance]:
+        return dict((await self.__get_owned_index(target_realm)).get_instances())
+
+    async def get_owned_application(self, application_id: str, target_realm: str = None) -> WGCOwnedApplicationInstance:
+        return (await self.__get_owned_index(target_realm)).get_instance(application_id)
+
+    async def get_owned_applications_by_gameid(self, game_id: str, target_realm: str = None) -> List[WGCOwnedApplicationInstance]:
+        return list((await self.__get_owned_index(target_realm)).get_instances_by_gameid(game_id))
+
+    def get_owned_applications_fingerprint(self, target_realm: str = None) -> str:
+        '''
+        returns fingerprint of the backend data used for the current owned applications of the realm,
+        None is returned if the data is incomplete
+        '''
+        previous = self.__owned_fingerprints.get(target_realm)
+        if previous is None or previous[1] is not self.__owned_indexes.get(target_realm):
+            return None
+
+        return previous[0]
+
+    def __get_products_fingerprint(self, target_realm: str = None) -> str:
+        fingerprints = list()
+        for realm in self.__get_catalog_realms(target_realm):
+            fingerprint = self.get_api_client().get_product_list_fingerprint(realm)
+            if fingerprint is None:
+                return None
+            fingerprints.append(fingerprint)
+
+        return str.join(':', fingerprints)
+
+    def invalidate_owned_applications(self, target_realm: str = None) -> None:
+        '''
+        drops cached owned applications for the given realm or for all realms
+        '''
+        if target_realm is None:
+            self.__owned_indexes.clear()
+            self.__owned_tasks.clear()
+        else:
+            self.__owned_indexes.pop(target_realm, None)
+            self.__owned_tasks.pop(target_realm, None)
+
+    def prefetch_owned_applications(self, target_realm: str = None) -> None:
+        '''
+        starts fetching of owned applications in background, result is used by the next get_owned_application* call
+        '''
+        index = self.__owned_indexes.get(target_realm)
+        if index is not None and index.get_age() < self.OWNED_APPLICATIONS_TTL:
+            return
+
+        if target_realm not in self.__owned_tasks:
+            self.__owned_tasks[target_realm] = asyncio.ensure_future(self.__build_owned_index(target_realm))
+
+    def start_metadata_prefetch(self, instances: Iterable[WGCOwnedApplicationInstance]) -> None:
+        '''
+        prefetches metadata for the owned applications which are not installed
+        '''
+        local_ids = self.get_local_applications().keys()
+        self.__metadata_prefetcher.start([instance for instance in instances if instance.get_application_id() not in local_ids])
+
+    def __load_local_application(self, app_dir: str) -> WGCLocalApplication:
+        try:
+            return WGCLocalApplication(app_dir)
+        except MetadataNotFoundError:
+            self.__logger.warning('WGC/get_local_applications: Failed to found game metadata from folder %s. ' % app_dir)
+        except MetadataParseError:
+            self.__logger.warning('WGC/get_local_applications: Failed to parse metadata in folder %s. ' % app_dir)
+        except PermissionError:
+            self.__logger.warning('WGC/get_local_applications: Failed to get accces to the folder %s. ' % app_dir)
+        except Exception:
+            self.__logger.exception('WGC/get_local_applications: Failed to load game metadata from folder %s. ' % app_dir)
+
+        return None
+
+    async def __get_owned_index(self, target_realm: str = None) -> WGCOwnedApplicationIndex:
+        index = self.__owned_indexes.get(target_realm)
+        if index is not None and index.get_age() < self.OWNED_APPLICATIONS_TTL:
+            return index
+
+        #join the fetch which is already in progress
+        self.prefetch_owned_applications(target_realm)
+        return await asyncio.shield(self.__owned_tasks[target_realm])
+
+    async def __build_owned_index(self, target_realm: str = None) -> WGCOwnedApplicationIndex:
+        task = self.__owned_tasks.get(target_realm)
+        try:
+            realms = self.__get_catalog_realms(target_realm)
+            realms_products = await self.__fetch_realms_products(realms)
+
+            #reuse the index if backend data was not changed, data is incomplete if any realm failed
+            fingerprint = None
+            if not any(isinstance(products, Exception) for products in realms_products):
+                fingerprint = self.__get_products_fingerprint(target_realm)
+
+            previous = self.__owned_fingerprints.get(target_realm)
+            if fingerprint is not None and previous is not None and previous[0] == fingerprint:
+                index = previous[1]
+                index.refresh()
+            else:
+                index = WGCOwnedApplicationIndex(self.__merge_owned_applications(target_realm, realms, realms_products))
+
+            #do not memoize failed requests
+            if index.get_instances():
+                self.__owned_indexes[target_realm] = index
+                if fingerprint is not None:
+                    self.__owned_fingerprints[target_realm] = (fingerprint, index)
+
+            return index
+        finally:
+            if self.__owned_tasks.get(target_realm) is task:
+                self.__owned_tasks.pop(target_realm, None)
+
+    def __get_catalog_realms(self, target_realm: str = None) -> List[str]:
+        '''
+        returns realms which are queried for the owned applications, target realm is always the first one
+        '''
+        if target_realm is None:
+            return [None]
+
+        return [target_realm] + [realm for realm in self.__catalog_realms if realm != target_realm]
+
+    async def __fetch_realms_products(self, realms: List[str]) -> List:
+        '''
+        returns product lists of the realms, failed realms are represented by exceptions
+        '''
+        #query all realms concurrently, failure of one realm does not affect others
+        return await asyncio.gather(*[self.get_api_client().fetch_product_list(realm) for realm in realms], return_exceptions=True)
+
+    def __merge_owned_applications(self, target_realm: str, realms: List[str], realms_products: List) -> List[WGCOwnedApplicationInstance]:
         applications_instances = dict()
-        for application in await self.get_api_client().fetch_product_list():
-            for key, application_instance in application.get_application_instances().items():
-
-                #skip if realm is not match our target
-                realm = application_instance.get_application_realm()
-                if target_realm is not None:
-                    if realm != 'WW' and realm != 'CT' and realm != target_realm:
-                        continue
-                
-                applications_instances[key] = application_instance
-
-        return applications_instances
+        for realm, products in zip(realms, realms_products):
+            if isinstance(products, Exception):
+                self.__logger.warning('WGC/__merge_owned_applications: failed to fetch products for realm %s: %s' % (realm, repr(products)))
+                continue
+
+            for application in products:
+                for key, application_instance in application.get_application_instances().items():
+
+                    #skip if realm is not match our target
+                    instance_realm = application_instance.get_application_realm()
+                    if target_realm is not None:
+                        if instance_realm != 'WW' and instance_realm != 'CT' and instance_realm != realm:
+                            continue
+
+                    #first realm wins for instances shared between realms
+                    if key not in applications_instances:
+                        applications_instances[key] = application_instance
+
+        return list(applications_instances.values())
+
+    def __on_login(self) -> None:
+        realm = self.get_wgni_client().get_account_realm()
+        if realm is not None:
+            self.prefetch_owned_applications(realm)
 
     # WGC Client
 
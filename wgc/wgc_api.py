@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: MIT
 
 from collections import namedtuple
+import hashlib
 import json
 import logging
 import os
@@ -10,15 +11,22 @@ import pprint
 
 import ssl
 import sys
+import tempfile
 import threading
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Tuple
 from urllib.parse import parse_qs
 
 import asyncio
 
+from mglx.mglx_jsonstream import MglxJsonArrayStream
+
 from .wgc_application_owned import WGCOwnedApplication
 from .wgc_constants import WGCIds, WGCAuthorizationResult, WGCRealms, GAMES_F2P
+from .wgc_error import MetadataNotFoundError, MetadataParseError
 from .wgc_http import WgcHttp
+from .wgc_metadata import WgcMetadata
+from .wgc_metadatacache import WgcMetadataCache
+from .wgc_xmlcache import XML_CACHE
 from .wgc_wgni import WgcWgni
 
 class WgcApi:
@@ -27,12 +35,17 @@ class WgcApi:
     WGCPS_LOGINSESSION = '/auth/api/v1/loginSession'
     
     WGUSCS_SHOWROOM = '/api/v18/content/showroom/'
+    WGUSCS_SHOWROOM_SHOWCASE_PATH = ['data', 'showcase']
+    WGUSCS_SHOWROOM_PRODUCT_PARAM = '&showcase_products='
+    WGUSCS_SHOWROOM_PRODUCTS_MAX_LENGTH = 1500
     
     WGUS_METADATA = '/api/v1/metadata'
     
     WGC_PUBLISHER_ID = 'wargaming'
 
-    def __init__(self, http : WgcHttp, wgni : WgcWgni, country_code : str = '', language_code : str = 'en'):
+    SHOWROOM_STREAMING = True
+
+    def __init__(self, http : WgcHttp, wgni : WgcWgni, country_code : str = '', language_code : str = 'en', metadata_cache : WgcMetadataCache = None):
         self.__logger = logging.getLogger('wgc_api')
 
         self.__http = http
@@ -41,54 +54,184 @@ class WgcApi:
         self._country_code = country_code
         self._language_code = language_code
 
+        self.__metadata_cache = metadata_cache
+        #cache key -> temporary file, used when metadata cache is not available
+        self.__metadata_fallback_files = dict()
+        self.__metadata_cache_writable = True
+
+        self.__product_list_cache = dict()
+        self.__product_list_fingerprint = dict()
+
     async def shutdown(self):
-        pass
+        for path in self.__metadata_fallback_files.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.__metadata_fallback_files.clear()
 
     #
     # Fetch product list
     #
 
-    async def fetch_product_list(self) -> List[WGCOwnedApplication]:
+    def get_product_list_fingerprint(self, realm: str = None) -> str:
+        '''
+        returns fingerprint of the backend data used for the last product list of the realm (account realm by default)
+        '''
+        return self.__product_list_fingerprint.get(self.__get_product_list_key(realm))
+
+    async def fetch_product_list(self, realm: str = None) -> List[WGCOwnedApplication]:
+        '''
+        fetches product list for the realm (account realm by default)
+        '''
         product_list = list()
 
+        if realm is None:
+            realm = self.__wgni.get_account_realm()
+
+        cache_key = self.__get_product_list_key(realm)
+        product_list_cache = self.__product_list_cache.get(cache_key)
+
+        #serve cached data if backends are known to be down
+        #login session is bound to the account realm, so purchases can not be requested for other realms,
+        #only free-to-play applications of the showroom are available there
+        is_account_realm = realm == self.__wgni.get_account_realm()
+
+        if product_list_cache is not None:
+            if (is_account_realm and not self.__http.is_available('wgcps', realm)) or not self.__http.is_available('wguscs', realm):
+                self.__logger.warning('fetch_product_list: backend is unavailable, using cached data')
+                return list(product_list_cache)
+
         additional_gameurls = list()
         purchased_gameids = list()
-        wgcps_product_list = await self.__wgcps_fetch_product_list()
+        wgcps_product_list = None
+        if is_account_realm:
+            wgcps_product_list = await self.__wgcps_fetch_product_list(realm)
+            if wgcps_product_list is None and product_list_cache is not None:
+                self.__logger.warning('fetch_product_list: error on retrieving product list, using cached data')
+                return list(product_list_cache)
+
+        #purchased products are missing from incomplete list, so it must not replace the complete one
+        is_complete = wgcps_product_list is not None or not is_account_realm
+        if wgcps_product_list is not None and not wgcps_product_list['data']['product_content_complete']:
+            is_complete = False
+            if product_list_cache is not None:
+                self.__logger.warning('fetch_product_list: product list is incomplete, using cached data')
+                return list(product_list_cache)
+
         if wgcps_product_list is not None:
             for game_data in wgcps_product_list['data']['product_content']:
                 wgc_data = game_data['metadata']['wgc']
                 additional_gameurls.append('%s@%s' % (wgc_data['application_id']['data'], wgc_data['update_url']['data']))
                 purchased_gameids.append(wgc_data['application_id']['data'].split('.')[0])
 
-        showroom_data = await self.__wguscs_get_showroom(additional_gameurls)
-        if showroom_data is None:
-            self.__logger.error('fetch_product_list: error on retrieving showroom data')
-            return product_list
+        #request showroom in size-bounded chunks concurrently, raw products are buffered until fingerprint is checked
+        showroom_chunks = self.__split_showroom_products(additional_gameurls)
+        chunks_products = [list() for _ in showroom_chunks]
+        chunks_fingerprints = [hashlib.sha1() for _ in showroom_chunks]
 
-        for product in showroom_data['data']['showcase']:
-            #check that instances are exists
-            if not product['instances']:
-                self.__logger.warn('fetch_product_list: product has no instances %s' % product)
-                continue
+        showroom_results = await asyncio.gather(*[
+            self.__wguscs_get_showroom(realm, chunk, chunk_products.append, chunk_fingerprint)
+            for (chunk, chunk_products, chunk_fingerprint) in zip(showroom_chunks, chunks_products, chunks_fingerprints)])
 
-            #prase game id
-            app_gameid = None
-            try:
-                app_gameid = product['instances'][0]['application_id'].split('.')[0]
-            except:
-                self.__logger.exception('fetch_product_list: failed to get app_id')
+        if not all(showroom_results):
+            if product_list_cache is not None:
+                self.__logger.warning('fetch_product_list: error on retrieving showroom data, using cached data')
+                return list(product_list_cache)
 
-            if app_gameid in GAMES_F2P or app_gameid in purchased_gameids:
-                is_purchased = app_gameid in purchased_gameids and app_gameid not in GAMES_F2P
-                product_list.append(WGCOwnedApplication(product, is_purchased, self))
-            else:
-                self.__logger.warning('fetch_product_list: unknown ID %s' % app_gameid)
+            self.__logger.error('fetch_product_list: error on retrieving showroom data')
+            return list()
+
+        fingerprint = hashlib.sha1()
+        for gameurl in additional_gameurls:
+            fingerprint.update(gameurl.encode('utf-8'))
+        for chunk_fingerprint in chunks_fingerprints:
+            fingerprint.update(chunk_fingerprint.digest())
+
+        #keep previously created objects if backend data was not changed
+        fingerprint = fingerprint.hexdigest()
+        if product_list_cache is not None and fingerprint == self.__product_list_fingerprint.get(cache_key):
+            return list(product_list_cache)
+
+        #merge chunks in stable order
+        application_ids = set()
+        for chunk_products in chunks_products:
+            for product in chunk_products:
+                try:
+                    application = self.__create_owned_application(product, purchased_gameids)
+                except Exception:
+                    self.__logger.exception('fetch_product_list: failed to create application from %s' % product)
+                    continue
+
+                if application is None:
+                    continue
+
+                instances_ids = application.get_application_instances().keys()
+                if not application_ids.isdisjoint(instances_ids):
+                    continue
+
+                application_ids.update(instances_ids)
+                product_list.append(application)
+
+        #incomplete list has no fingerprint, so consumers do not treat missing products as removed
+        if not is_complete:
+            self.__logger.warning('fetch_product_list: product list is incomplete')
+            return list(product_list)
+
+        self.__product_list_cache[cache_key] = product_list
+        self.__product_list_fingerprint[cache_key] = fingerprint
+        return list(product_list)
+
+    def __get_product_list_key(self, realm: str = None) -> Tuple[int, str]:
+        '''
+        returns (account id, realm) key of the product list caches
+        '''
+        if realm is None:
+            realm = self.__wgni.get_account_realm()
+
+        return (self.__wgni.get_account_id(), realm)
+
+    def __split_showroom_products(self, additional_urls: List[str]) -> List[List[str]]:
+        '''
+        splits additional showcase products into chunks which fit the query length limit
+        '''
+        chunks = [list()]
+        chunk_length = 0
+
+        for additional_url in additional_urls:
+            length = len(self.WGUSCS_SHOWROOM_PRODUCT_PARAM) + len(additional_url)
+            if chunks[-1] and chunk_length + length > self.WGUSCS_SHOWROOM_PRODUCTS_MAX_LENGTH:
+                chunks.append(list())
+                chunk_length = 0
+
+            chunks[-1].append(additional_url)
+            chunk_length += length
+
+        return chunks
+
+    def __create_owned_application(self, product: Dict, purchased_gameids: List[str]) -> WGCOwnedApplication:
+        #check that instances are exists
+        if not product['instances']:
+            self.__logger.warn('fetch_product_list: product has no instances %s' % product)
+            return None
 
-        return product_list
+        #prase game id
+        app_gameid = None
+        try:
+            app_gameid = product['instances'][0]['application_id'].split('.')[0]
+        except:
+            self.__logger.exception('fetch_product_list: failed to get app_id')
 
-    async def __wgcps_fetch_product_list(self):
+        if app_gameid in GAMES_F2P or app_gameid in purchased_gameids:
+            is_purchased = app_gameid in purchased_gameids and app_gameid not in GAMES_F2P
+            return WGCOwnedApplication(product, is_purchased, self)
+
+        self.__logger.warning('fetch_product_list: unknown ID %s' % app_gameid)
+        return None
+
+    async def __wgcps_fetch_product_list(self, realm: str):
         response = await self.__http.request_post_simple(
-            'wgcps', self.__wgni.get_account_realm(), self.WGCPS_FETCH_PRODUCT_INFO, 
+            'wgcps', realm, self.WGCPS_FETCH_PRODUCT_INFO, 
             json = { 'account_id' : self.__wgni.get_account_id(), 'country' : self._country_code, 'storefront' : 'wgc_showcase' })
 
         if response.status == 499:
@@ -97,6 +240,9 @@ class WgcApi:
         elif response.status == 502:
             self.__logger.warning('__wgcps_fetch_product_list: failed to get data: bad gateway')
             return None
+        elif response.status == 503:
+            self.__logger.warning('__wgcps_fetch_product_list: failed to get data: service unavailable')
+            return None
         elif response.status == 504:
             self.__logger.warning('__wgcps_fetch_product_list: failed to get data: gateway timeout')
             return None
@@ -116,49 +262,196 @@ class WgcApi:
                 self.__logger.error('__wgcps_fetch_product_list: error on retrieving account info: status=%s, text=%s' % (response.status, response.text), exc_info=True)
             return None
 
-        #load additional adata
+        #load additional adata, list is marked as incomplete if any product failed
         response_content['data']['product_content'] = list()
+        response_content['data']['product_content_complete'] = True
         for product_uri in response_content['data']['product_uris']:
-            product_response = await self.__http.request_get(product_uri)
+            product_response = await self.__http.request_get(product_uri, hedge = True)
             if product_response.status != 200:
                 self.__logger.error('__wgcps_fetch_product_list: error on retrieving product info: status=%s, text=%s' % (product_response.status, product_uri))
+                response_content['data']['product_content_complete'] = False
                 continue
 
-            response_content['data']['product_content'].append(json.loads(product_response.text))
+            try:
+                response_content['data']['product_content'].append(json.loads(product_response.text))
+            except ValueError:
+                self.__logger.exception('__wgcps_fetch_product_list: failed to parse product info: %s' % product_uri)
+                response_content['data']['product_content_complete'] = False
 
         return response_content
 
-    async def __wguscs_get_showroom(self, additional_urls : List[str] = None):
+    async def __wguscs_get_showroom(self, realm : str, additional_urls : List[str], product_handler : Callable[[Dict], None], fingerprint : Any = None) -> bool:
+        '''
+        requests showroom and passes showcase products to the handler,
+        in streaming mode products are parsed while the response is being received
+
+        `fingerprint` is a hashlib object which is updated with the response body
+        '''
         additionals = ''
         if additional_urls:     
-            additionals = '&showcase_products=' + str.join('&showcase_products=', additional_urls)
+            additionals = self.WGUSCS_SHOWROOM_PRODUCT_PARAM + str.join(self.WGUSCS_SHOWROOM_PRODUCT_PARAM, additional_urls)
 
-        url = self.__http.get_url('wguscs', self.__wgni.get_account_realm(), self.WGUSCS_SHOWROOM)
+        url = self.WGUSCS_SHOWROOM
         url = url + '?lang=%s' % self._language_code.upper()
-        url = url + '&gameid=%s' % WGCIds[self.__wgni.get_account_realm()]
+        url = url + '&gameid=%s' % WGCIds[realm]
         url = url + '&wgc_publisher_id=%s' % WgcApi.WGC_PUBLISHER_ID
         url = url + '&format=json'
         url = url + '&country_code=%s' % self._country_code
         url = url + additionals
 
-        showroom_response = await self.__http.request_get(url)
+        stream = None
+        if self.SHOWROOM_STREAMING:
+            stream = MglxJsonArrayStream(self.WGUSCS_SHOWROOM_SHOWCASE_PATH)
+
+        #products are parsed while receiving, but passed to the handler only after the request is completed,
+        #so handler errors do not abort the request
+        showroom_products = list()
+
+        def process_chunk(chunk: bytes) -> None:
+            if fingerprint is not None:
+                fingerprint.update(chunk)
+            showroom_products.extend(stream.feed(chunk))
+
+        #hedging is not applied to streamed responses, so it is requested for buffered ones only
+        if stream is not None:
+            showroom_response = await self.__http.request_get_simple('wguscs', realm, url, chunk_handler = process_chunk)
+        else:
+            showroom_response = await self.__http.request_get_simple('wguscs', realm, url, hedge = True)
         
-        if showroom_response.status != 200:
+        if showroom_response.status == 503:
+            self.__logger.warning('__wguscs_get_showroom: failed to get data: service unavailable')
+            return False
+        elif showroom_response.status != 200:
             self.__logger.error('__wguscs_get_showroom: error on retrieving showroom data: status=%s, text=%s' % (showroom_response.status, showroom_response.text))
-            return None
+            return False
+
+        showroom_body = showroom_response.text
+        if stream is None and fingerprint is not None:
+            fingerprint.update(showroom_body.encode('utf-8'))
 
-        return json.loads(showroom_response.text)
+        if stream is not None:
+            showroom_products.extend(stream.close())
+
+            if not stream.is_completed():
+                showroom_body = stream.get_raw()
+                if showroom_body is None:
+                    self.__logger.error('__wguscs_get_showroom: failed to parse showroom data stream')
+                    return False
+                stream = None
+
+        #non-streamable payload, parse it outside of event loop
+        if stream is None:
+            try:
+                showroom_data = await asyncio.get_event_loop().run_in_executor(None, json.loads, showroom_body)
+                showroom_products = showroom_data['data']['showcase']
+            except Exception:
+                self.__logger.exception('__wguscs_get_showroom: failed to parse showroom data')
+                return False
+
+        for product in showroom_products:
+            try:
+                product_handler(product)
+            except Exception:
+                self.__logger.exception('__wguscs_get_showroom: failed to process product %s' % product)
+
+        return True
 
     #
     # Metadata download
     # 
 
+    async def get_app_metadata(self, update_server: str, app_id: str) -> WgcMetadata:
+        '''
+        returns parsed metadata, file is revalidated on every call and parsed again only when it was changed
+        '''
+        metadata_file = await self.fetch_app_metadata_file(update_server, app_id)
+        if metadata_file is None:
+            return None
+
+        #parsed summary is reused from XML_CACHE while the file is not modified
+        try:
+            return await asyncio.get_event_loop().run_in_executor(None, WgcMetadata, metadata_file)
+        except (MetadataNotFoundError, MetadataParseError):
+            self.__logger.warning('get_app_metadata: failed to parse metadata for %s' % app_id)
+            return None
+
     async def fetch_app_metadata(self, update_server: str, app_id: str) -> str:
+        metadata_file = await self.fetch_app_metadata_file(update_server, app_id)
+        if metadata_file is None:
+            return None
+
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    async def fetch_app_metadata_file(self, update_server: str, app_id: str) -> str:
+        '''
+        downloads metadata into the cache and returns path to the cached file,
+        temporary file is used when the cache is not available or not writable
+        '''
         url = '%s/%s/?guid=%s&chain_id=unknown&protocol_version=7.2' % (update_server, self.WGUS_METADATA, app_id)
-        
-        response = await self.__http.request_get(url) 
+
+        if self.__metadata_cache is not None and self.__metadata_cache_writable:
+            try:
+                return await self.__fetch_app_metadata_cached(url, update_server, app_id)
+            except OSError:
+                self.__logger.warning('fetch_app_metadata_file: metadata cache is not writable, downloading without it')
+                self.__metadata_cache_writable = False
+
+        return await self.__fetch_app_metadata_uncached(url, update_server, app_id)
+
+    async def __fetch_app_metadata_uncached(self, url: str, update_server: str, app_id: str) -> str:
+        response = await self.__http.request_get(url)
         if response.status != 200:
-            self.__logger.error('fetch_app_metadata: error on retrieving metadata: url=%s, response=%s)' % (url, response.text))
+            self.__logger.error('__fetch_app_metadata_uncached: error on retrieving metadata: url=%s, response=%s)' % (url, response.text))
+            return None
+
+        #single temporary file per application, removed on shutdown
+        cache_key = WgcMetadataCache.get_key(update_server, app_id)
+        path = self.__metadata_fallback_files.get(cache_key)
+        try:
+            if path is None:
+                fd, path = tempfile.mkstemp(prefix = 'wgc_metadata_', suffix = WgcMetadataCache.EXTENSION_DATA)
+                os.close(fd)
+                self.__metadata_fallback_files[cache_key] = path
+
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(response.text)
+        except OSError:
+            self.__logger.exception('__fetch_app_metadata_uncached: failed to write metadata of %s' % app_id)
             return None
 
-        return response.text
+        XML_CACHE.invalidate(path)
+        return path
+
+    async def __fetch_app_metadata_cached(self, url: str, update_server: str, app_id: str) -> str:
+        '''
+        downloads metadata into the cache, raises OSError if the cache is not writable
+        '''
+        cache_key = self.__metadata_cache.get_key(update_server, app_id)
+        cache_writer = self.__metadata_cache.create_writer(cache_key)
+
+        try:
+            response = await self.__http.request_get(url, headers = self.__metadata_cache.get_validators(cache_key), chunk_handler = cache_writer.write)
+        except Exception:
+            cache_writer.discard()
+            raise
+
+        if response.status == 200:
+            try:
+                return cache_writer.commit(response.headers)
+            except OSError:
+                cache_writer.discard()
+                raise
+
+        cache_writer.discard()
+        if response.status == 304:
+            return self.__metadata_cache.touch(cache_key)
+
+        #serve stale file if update service is not available
+        cached_file = self.__metadata_cache.touch(cache_key)
+        if cached_file is not None:
+            self.__logger.warning('__fetch_app_metadata_cached: error on retrieving metadata, using cached file: url=%s, status=%s' % (url, response.status))
+            return cached_file
+
+        self.__logger.error('__fetch_app_metadata_cached: error on retrieving metadata: url=%s, response=%s)' % (url, response.text))
+        return None
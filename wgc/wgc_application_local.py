@@ -6,9 +6,7 @@ import logging
 import os
 import subprocess
 import xml.etree.ElementTree as ElementTree
-from typing import Dict, List
-
-import psutil
+from typing import Dict, List, Tuple
 
 from .wgc_constants import ADDITIONAL_EXECUTABLE_NAMES
 from .wgc_error import MetadataNotFoundError
@@ -17,6 +15,8 @@ from .wgc_helper import DETACHED_PROCESS, file_copy
 from .wgc_launcher import WgcLauncher
 from .wgc_location import WGCLocation
 from .wgc_metadata import WgcMetadata
+from .wgc_processes import WgcProcessHandle, WgcProcessIndex
+from .wgc_size import WgcSizeCalculator
 
 class WGCLocalApplication():
     
@@ -31,26 +31,33 @@ class WGCLocalApplication():
         self.__gameinfo = WgcGameInfo(os.path.join(self.__folder, self.INFO_FILE))
         self.__metadata = WgcMetadata(os.path.join(self.__folder, self.METADATA_FILE))
 
+    @staticmethod
+    def get_signature(folder: str) -> Tuple:
+        '''
+        returns (mtime, size) stat signature of the application XML files, None items are used for missing files
+        '''
+        signature = list()
+        for filename in (WGCLocalApplication.INFO_FILE, WGCLocalApplication.METADATA_FILE):
+            try:
+                stat = os.stat(os.path.join(folder, filename))
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+
+        return tuple(signature)
+
     def get_app_id(self) -> str:
         return self.__metadata.get_app_id()
 
-    async def get_app_size(self) -> int:
-        total_size = 0
+    async def get_app_size(self, calculator: WgcSizeCalculator) -> int:
         try:
-            for dirpath, _, filenames in os.walk(self.__folder):
-                for f in filenames:
-                    await asyncio.sleep(0)
-                    fp = os.path.join(dirpath, f)
-                    if not os.path.islink(fp):
-                        try:
-                            total_size += os.path.getsize(fp)
-                        except FileNotFoundError:
-                            pass
-
+            return await calculator.get_size(self.__folder)
+        except asyncio.CancelledError:
+            raise
         except Exception:
             self.__logger.exception('get_app_size:')
 
-        return total_size
+        return 0
 
     def GetGameId(self) -> str:
         instance_id = self.get_app_id()
@@ -93,48 +100,25 @@ class WGCLocalApplication():
         '''
         return os.path.join(self.GetGameFolder(), self.WGCAPI_FILE)
 
-    def is_running(self) -> bool:
+    def is_running(self, process_index: WgcProcessIndex = None) -> bool:
+        '''
+        check if current local application is running, shared process index should be passed when several applications are checked
+        '''
+        app_pathes = self.GetExecutablePaths()
+
+        if process_index is None:
+            process_index = WgcProcessIndex.create(WgcProcessIndex.get_process_names(app_pathes))
+
+        return process_index.is_running(app_pathes)
+
+    def run_application(self, platform) -> WgcProcessHandle:
         '''
-        check if current local application is running
+        runs application, returns handle of the started process or None on failure
         '''
-        app_pathes = list()
-        proc_pathes = list()
-        cmdline_pathes = list()
-
-        #populate app pathes
-        for app_path in self.GetExecutablePaths():
-            if app_path is None or app_path == '':
-                continue
-            app_pathes.append(app_path.lower().replace('\\','/'))
-
-        #populate proc pathes
-        for proc in psutil.process_iter(['exe', 'cmdline']):
-            proc_exe = proc.info['exe']
-            proc_cmdline = proc.info['cmdline']
-
-            #process exe
-            if not proc_exe:
-                continue
-            proc_pathes.append(proc_exe.lower().replace('\\','/'))
-
-            #process cmdline
-            if proc_cmdline and len(proc_cmdline) > 1 and proc_cmdline[0] == 'winewrapper.exe':
-                cmdline_pathes.extend([i.lower().replace('\\','/') for i in proc_cmdline])
-
-        #check pathes
-        for app_path in app_pathes:
-            if app_path in proc_pathes:
-                return True
-            if app_path in cmdline_pathes:
-                return True
-
-        return False
-
-    def run_application(self, platform) -> bool:
         return WgcLauncher.launch_app(self.GetExecutablePath(platform))
 
     def uninstall_application(self) -> bool:
         #update wgcapi
         file_copy(WGCLocation.get_wgc_wgcapi_path(), self.get_application_wgcapi_path())
 
-        return WgcLauncher.launch_app(self.get_application_wgcapi_path(), ['--uninstall'])
+        return WgcLauncher.launch_app(self.get_application_wgcapi_path(), ['--uninstall']) is not None
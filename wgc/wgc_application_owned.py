@@ -1,52 +1,77 @@
 # (c) 2019-2020 Mikhail Paulyshka
 # SPDX-License-Identifier: MIT
 
-import codecs
 import logging
 import os
 import random
 import string
 import subprocess
-from typing import Dict
+import time
+from typing import Dict, Iterable, List, NamedTuple
 
 
 from .wgc_apptype import WgcAppType
 from .wgc_gameinfo import WgcGameInfo
-from .wgc_helper import DETACHED_PROCESS, fixup_gamename, get_platform
+from .wgc_helper import DETACHED_PROCESS, file_copy, fixup_gamename, get_platform
 from .wgc_launcher import WgcLauncher
 from .wgc_location import WGCLocation
-from .wgc_metadata import WgcMetadata
 from .wgc_preferences import WgcPreferences
 
+class WGCOwnedApplicationRecord(NamedTuple):
+    '''
+    Immutable owned application instance data, built once from showroom JSON
+    '''
+
+    application_id: str
+    game_id: str
+    realm: str
+    name: str
+    fullname: str
+    update_service_url: str
+    is_purchased: bool
+
+    @staticmethod
+    def from_json(game_name: str, instance_data: Dict, is_purchased: bool) -> 'WGCOwnedApplicationRecord':
+        application_id = instance_data['application_id']
+        application_id_parts = application_id.split('.')
+
+        name = fixup_gamename(game_name)
+        realm = application_id_parts[1]
+
+        return WGCOwnedApplicationRecord(
+            application_id = application_id,
+            game_id = application_id_parts[0],
+            realm = realm,
+            name = name,
+            fullname = name if realm == 'WW' else '%s (%s)' % (name, realm),
+            update_service_url = instance_data['update_service_url'],
+            is_purchased = is_purchased)
+
+
 class WGCOwnedApplicationInstance():
-    def __init__(self, app_data, instance_data, is_purchased, api):
-        self.__logger = logging.getLogger('wgc_application_owned_instance')
+    __slots__ = ('__record', '__api')
 
-        self._name = app_data['game_name']
-        self._data = instance_data
-        self.__is_purchased = is_purchased
+    def __init__(self, record: WGCOwnedApplicationRecord, api):
+        self.__record = record
         self.__api = api
 
     def get_application_id(self):
-        return self._data['application_id']
+        return self.__record.application_id
 
     def get_application_gameid(self):
-        return self.get_application_id().split('.')[0]
+        return self.__record.game_id
 
     def get_application_realm(self):
-        return self.get_application_id().split('.')[1]
+        return self.__record.realm
 
     def get_application_name(self):
-        return fixup_gamename(self._name)
+        return self.__record.name
 
     def get_application_fullname(self):
-        if self.get_application_realm() == 'WW':
-            return self.get_application_name()
-        else:
-            return '%s (%s)' % (self.get_application_name(), self.get_application_realm())
+        return self.__record.fullname
 
     def get_application_install_url(self):
-        return '%s@%s' % (self.get_application_id(), self.get_update_service_url())
+        return '%s@%s' % (self.__record.application_id, self.__record.update_service_url)
 
     async def get_metadata(self) -> str:
         '''
@@ -54,15 +79,21 @@ class WGCOwnedApplicationInstance():
         '''
         return await self.__api.fetch_app_metadata(self.get_update_service_url(), self.get_application_id())
 
+    async def get_metadata_file(self) -> str:
+        '''
+        downloads metadata into the cache and returns path to it
+        '''
+        return await self.__api.fetch_app_metadata_file(self.get_update_service_url(), self.get_application_id())
+
     def get_update_service_url(self):
-        return self._data['update_service_url']
+        return self.__record.update_service_url
 
     def is_application_purchased(self) -> bool:
-        return self.__is_purchased
+        return self.__record.is_purchased
 
     async def install_application(self) -> bool:
         if not WGCLocation.is_wgc_installed():
-            self.__logger.warning('install_application: failed to install %s because WGC is not installed' % self.get_application_id())
+            logging.getLogger('wgc_application_owned_instance').warning('install_application: failed to install %s because WGC is not installed' % self.get_application_id())
             return False
 
         if get_platform() == 'macos':
@@ -70,7 +101,7 @@ class WGCOwnedApplicationInstance():
         elif get_platform() == 'windows':
             return WgcLauncher.launch_wgc_gameinstall(self.get_application_install_url())
         else:
-            self.__logger.error('install_application: unsupported platform %s' % get_platform())
+            logging.getLogger('wgc_application_owned_instance').error('install_application: unsupported platform %s' % get_platform())
             return False
 
     async def install_application_macos(self) -> bool:
@@ -89,9 +120,12 @@ class WGCOwnedApplicationInstance():
         os.makedirs(dir_metadata, exist_ok=True)
 
         #game_metadata/metadata.xml
-        with codecs.open(file_metadata, 'w', 'utf-8') as f:
-            f.write(await self.get_metadata())
-        metadata = WgcMetadata(file_metadata)
+        metadata = await self.__api.get_app_metadata(self.get_update_service_url(), self.get_application_id())
+        if metadata is None:
+            logging.getLogger('wgc_application_owned_instance').error('install_application_macos: failed to get metadata for %s' % self.get_application_id())
+            return False
+
+        file_copy(metadata.get_filepath(), file_metadata)
     
         #root/app_type.xml
         WgcAppType.create_file(file_apptype, metadata.get_default_client_type(), metadata.get_default_client_type())
@@ -115,22 +149,63 @@ class WGCOwnedApplicationInstance():
 
 
 class WGCOwnedApplication():
+    __slots__ = ('__name', '__is_purchased', '_instances')
 
     def __init__(self, data, is_purchased, api):
-        self.__data = data
+        self.__name = fixup_gamename(data['game_name'])
         self.__is_purchased = is_purchased
-        self.__api = api
 
+        #keep only compact records, raw JSON is not retained
         self._instances = dict()
-        for instance_json in self.__data['instances']:
-            instance_obj = WGCOwnedApplicationInstance(self.__data, instance_json, is_purchased, self.__api)
+        for instance_json in data['instances']:
+            instance_obj = WGCOwnedApplicationInstance(WGCOwnedApplicationRecord.from_json(data['game_name'], instance_json, is_purchased), api)
             self._instances[instance_obj.get_application_id()] = instance_obj
 
     def is_application_purchased(self) -> bool:
         return self.__is_purchased
 
     def get_application_name(self) -> str:
-        return fixup_gamename(self.__data['game_name'])
+        return self.__name
 
     def get_application_instances(self) -> Dict[str, WGCOwnedApplicationInstance]:
         return self._instances
+
+
+class WGCOwnedApplicationIndex():
+    '''
+    Owned application instances indexed by application id and by game id
+    '''
+
+    __slots__ = ('__instances', '__gameids', '__created_at')
+
+    def __init__(self, instances: Iterable[WGCOwnedApplicationInstance]):
+        self.__instances = dict()
+        self.__gameids = dict()
+        self.__created_at = time.monotonic()
+
+        for instance in instances:
+            self.__instances[instance.get_application_id()] = instance
+
+        for instance in self.__instances.values():
+            self.__gameids.setdefault(instance.get_application_gameid(), list()).append(instance)
+
+    def get_age(self) -> float:
+        '''
+        returns index age in seconds
+        '''
+        return time.monotonic() - self.__created_at
+
+    def refresh(self) -> None:
+        '''
+        resets index age, used when backend data was not changed since the index was built
+        '''
+        self.__created_at = time.monotonic()
+
+    def get_instances(self) -> Dict[str, WGCOwnedApplicationInstance]:
+        return self.__instances
+
+    def get_instance(self, application_id: str) -> WGCOwnedApplicationInstance:
+        return self.__instances.get(application_id)
+
+    def get_instances_by_gameid(self, game_id: str) -> List[WGCOwnedApplicationInstance]:
+        return self.__gameids.get(game_id, list())
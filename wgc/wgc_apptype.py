@@ -6,12 +6,17 @@ import xml.etree.ElementTree as ElementTree
 from xml.dom import minidom
 
 from .wgc_error import MetadataNotFoundError
+from .wgc_helper import xml_probe
+from .wgc_xmlcache import XML_CACHE
 
 class WgcAppType():
     '''
     Game app_type.xml file
     '''
 
+    PATH_APPTYPE = 'app_type'
+    PATH_SWITCHTYPE = 'switch_to_type'
+
     @staticmethod 
     def create_file(filepath: str, app_type: str, switch_to_type: str):
         '''
@@ -30,25 +35,26 @@ class WgcAppType():
         with open(filepath, "w") as f:
             f.write(minidom.parseString(text).toprettyxml(indent="  "))
 
+        XML_CACHE.invalidate(filepath)
+
 
     def __init__(self, filepath: str):
         
         if not os.path.exists(filepath):
             raise MetadataNotFoundError("WgcAppType/__init__: %s does not exists" % filepath)
         
-        self.__root = ElementTree.parse(filepath).getroot()
+        self.__values = XML_CACHE.get(filepath, 'apptype', lambda path: xml_probe(path, [WgcAppType.PATH_APPTYPE, WgcAppType.PATH_SWITCHTYPE]))
 
 
     def get_apptype(self) -> str:
         '''
         returns app_type.xml/protocol/app_type
         '''
-        return self.__root.find('app_type').text
+        return self.__values.get(self.PATH_APPTYPE)
 
 
     def get_switchtype(self) -> str:
         '''
         returns app_type.xml/protocol/switch_to_type
         '''
-        return self.__root.find('switch_to_type').text
-
+        return self.__values.get(self.PATH_SWITCHTYPE)
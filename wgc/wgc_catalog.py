@@ -0,0 +1,177 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import logging
+from typing import Any, Dict, FrozenSet, List
+
+from .wgc_application_local import WGCLocalApplication
+from .wgc_application_owned import WGCOwnedApplicationInstance
+
+class WgcCatalogRecord():
+    '''
+    Catalog record which joins owned and local data of single application
+    '''
+
+    __slots__ = ('owned', 'local', 'os_compatibility', 'state')
+
+    def __init__(self):
+        self.owned = None
+        self.local = None
+        self.os_compatibility = None
+        self.state = None
+
+    def is_empty(self) -> bool:
+        return self.owned is None and self.local is None and not self.state
+
+
+class WgcCatalog():
+    '''
+    Index of applications by application id, updated incrementally from owned and local sources
+    '''
+
+    PLATFORM_WINDOWS = 'windows'
+
+    def __init__(self):
+        self.__logger = logging.getLogger('wgc_catalog')
+        self.__records = dict()
+
+        #application id -> list of platforms, rebuilt after change of catalog or restrictions
+        self.__compatibility = None
+        self.__platform = self.PLATFORM_WINDOWS
+        self.__allowed_ids = frozenset()
+
+    #
+    # Lookup
+    #
+
+    def get_owned(self, application_id: str) -> WGCOwnedApplicationInstance:
+        record = self.__records.get(application_id)
+        return record.owned if record is not None else None
+
+    def get_local(self, application_id: str) -> WGCLocalApplication:
+        record = self.__records.get(application_id)
+        return record.local if record is not None else None
+
+    def get_local_applications(self) -> Dict[str, WGCLocalApplication]:
+        return {application_id: record.local for application_id, record in self.__records.items() if record.local is not None}
+
+    def get_state(self, application_id: str) -> Any:
+        record = self.__records.get(application_id)
+        return record.state if record is not None else None
+
+    def get_states(self) -> Dict[str, Any]:
+        return {application_id: record.state for application_id, record in self.__records.items() if record.state is not None}
+
+    def get_compatibility(self, application_id: str) -> List[str]:
+        '''
+        returns platforms supported by application, local data takes precedence over games restrictions
+        '''
+        if self.__compatibility is None:
+            self.__compatibility = self.__build_compatibility()
+
+        result = self.__compatibility.get(application_id)
+        if result is None:
+            result = self.__get_restricted_compatibility(application_id)
+
+        return result
+
+    #
+    # Update
+    #
+
+    def update_owned(self, instances: Dict[str, WGCOwnedApplicationInstance]) -> None:
+        '''
+        replaces owned instances, records for the missing instances lose their owned part
+        '''
+        for application_id, record in list(self.__records.items()):
+            if record.owned is not None and application_id not in instances:
+                record.owned = None
+                self.__cleanup(application_id)
+                self.__compatibility = None
+
+        for application_id, instance in instances.items():
+            record = self.__get_or_create(application_id)
+            if record.owned is None:
+                self.__compatibility = None
+            record.owned = instance
+
+    def update_local(self, applications: Dict[str, WGCLocalApplication]) -> List[str]:
+        '''
+        replaces local applications, returns ids of applications which are not installed anymore
+        '''
+        removed = list()
+        for application_id, record in list(self.__records.items()):
+            if record.local is not None and application_id not in applications:
+                record.local = None
+                record.os_compatibility = None
+                removed.append(application_id)
+                self.__cleanup(application_id)
+                self.__compatibility = None
+
+        for application_id, application in applications.items():
+            record = self.__get_or_create(application_id)
+            if record.local is application:
+                continue
+
+            record.local = application
+            record.os_compatibility = self.__get_local_os_compatibility(application)
+            self.__compatibility = None
+
+        return removed
+
+    def set_state(self, application_id: str, state: Any) -> None:
+        self.__get_or_create(application_id).state = state
+        self.__cleanup(application_id)
+
+    def set_restrictions(self, platform: str, allowed_ids: FrozenSet[str]) -> None:
+        '''
+        sets current platform and ids of applications allowed on it by games restrictions
+        '''
+        if platform == self.__platform and allowed_ids == self.__allowed_ids:
+            return
+
+        self.__platform = platform
+        self.__allowed_ids = allowed_ids
+        self.__compatibility = None
+
+    #
+    # Internals
+    #
+
+    def __get_or_create(self, application_id: str) -> WgcCatalogRecord:
+        record = self.__records.get(application_id)
+        if record is None:
+            record = WgcCatalogRecord()
+            self.__records[application_id] = record
+
+        return record
+
+    def __cleanup(self, application_id: str) -> None:
+        record = self.__records.get(application_id)
+        if record is not None and record.is_empty():
+            del self.__records[application_id]
+
+    def __build_compatibility(self) -> Dict[str, List[str]]:
+        compatibility = dict()
+        for application_id, record in self.__records.items():
+            if record.os_compatibility is not None:
+                compatibility[application_id] = record.os_compatibility
+            else:
+                compatibility[application_id] = self.__get_restricted_compatibility(application_id)
+
+        return compatibility
+
+    def __get_restricted_compatibility(self, application_id: str) -> List[str]:
+        #windows is supported in any way
+        result = [self.PLATFORM_WINDOWS]
+        if self.__platform != self.PLATFORM_WINDOWS and application_id in self.__allowed_ids:
+            result.append(self.__platform)
+
+        return result
+
+    def __get_local_os_compatibility(self, application: WGCLocalApplication) -> List[str]:
+        try:
+            return list(application.GetOsCompatibility())
+        except Exception:
+            self.__logger.warning('__get_local_os_compatibility: failed to get OS compatibility for %s' % application.get_app_id())
+            return None
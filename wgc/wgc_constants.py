@@ -131,6 +131,14 @@ PAPI_WOT_REALMS = {
     }
 }
 
+# (requests per second, burst allowance) per host type
+HTTP_RATE_LIMITS = {
+    'wgnet'  : (5.0, 10),
+    'wgcps'  : (5.0, 10),
+    'wguscs' : (5.0, 10),
+    'papi'   : (10.0, 10),
+}
+
 FALLBACK_COUNTRY = ''
 FALLBACK_LANGUAGE = 'en'
 
@@ -0,0 +1,245 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import abc
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import time
+from typing import Iterable, Set
+
+class WgcFsWatcher(abc.ABC):
+    '''
+    Watches directories and files for changes
+
+    Directory paths report any change of their entries, file paths report changes of the file only.
+    '''
+
+    #bursts of events are merged into single change set
+    DEBOUNCE_INTERVAL = 0.5
+
+    @staticmethod
+    def create(polling: bool = False) -> 'WgcFsWatcher':
+        '''
+        creates inotify based watcher when it is available, polling one otherwise
+        '''
+        if not polling and sys.platform.startswith('linux'):
+            try:
+                return WgcFsWatcherInotify()
+            except (OSError, AttributeError):
+                logging.getLogger('wgc_fswatcher').warning('create: failed to initialize inotify, falling back to polling')
+
+        return WgcFsWatcherPolling()
+
+    @abc.abstractmethod
+    def set_paths(self, paths: Iterable[str]) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def get_changes(self, timeout: float) -> Set[str]:
+        '''
+        waits for changes, returns changed paths or empty set on timeout
+        '''
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class WgcFsWatcherPolling(WgcFsWatcher):
+    '''
+    Watcher which compares stat signatures of paths, used where inotify is not available (Windows, macOS, Wine prefixes on network shares)
+    '''
+
+    POLL_INTERVAL = 5.0
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        self.__poll_interval = poll_interval
+        self.__signatures = dict()
+
+    def set_paths(self, paths: Iterable[str]) -> None:
+        signatures = dict()
+        for path in paths:
+            signatures[path] = self.__signatures[path] if path in self.__signatures else self.__get_signature(path)
+
+        self.__signatures = signatures
+
+    async def get_changes(self, timeout: float) -> Set[str]:
+        deadline = time.monotonic() + timeout
+        while True:
+            changes = set()
+            for path, signature in self.__signatures.items():
+                new_signature = self.__get_signature(path)
+                if new_signature != signature:
+                    self.__signatures[path] = new_signature
+                    changes.add(path)
+
+            if changes:
+                return changes
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return changes
+
+            await asyncio.sleep(min(self.__poll_interval, remaining))
+
+    @staticmethod
+    def __get_signature(path: str):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+
+class WgcFsWatcherInotify(WgcFsWatcher):
+    '''
+    Linux inotify watcher, parent directories of the watched files are watched and events are filtered by name
+    '''
+
+    IN_MODIFY      = 0x00000002
+    IN_ATTRIB      = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF   = 0x00000800
+    IN_IGNORED     = 0x00008000
+    IN_NONBLOCK    = 0x00000800
+    IN_CLOEXEC     = 0x00080000
+
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    EVENT_HEADER = struct.Struct('iIII')
+    READ_SIZE = 64 * 1024
+
+    def __init__(self):
+        self.__logger = logging.getLogger('wgc_fswatcher')
+
+        self.__libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.__fd = self.__libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        #directory -> watch descriptor
+        self.__watches = dict()
+        #watch descriptor -> directory
+        self.__directories = dict()
+        #directory -> set of watched names or None when any entry is watched
+        self.__filters = dict()
+
+        self.__changes = set()
+        self.__event = None
+        self.__reader_loop = None
+
+    def set_paths(self, paths: Iterable[str]) -> None:
+        filters = dict()
+        for path in paths:
+            if os.path.isdir(path):
+                filters[path] = None
+                continue
+
+            directory, name = os.path.split(path)
+            if directory in filters and filters[directory] is None:
+                continue
+            filters.setdefault(directory, set()).add(name)
+
+        #remove obsolete watches
+        for directory in list(self.__watches.keys()):
+            if directory not in filters:
+                self.__libc.inotify_rm_watch(self.__fd, self.__watches[directory])
+                self.__directories.pop(self.__watches.pop(directory), None)
+
+        #add new watches
+        for directory in filters:
+            if directory in self.__watches:
+                continue
+
+            wd = self.__libc.inotify_add_watch(self.__fd, os.fsencode(directory), self.WATCH_MASK)
+            if wd < 0:
+                self.__logger.info('set_paths: failed to watch %s, errno %s' % (directory, ctypes.get_errno()))
+                continue
+
+            self.__watches[directory] = wd
+            self.__directories[wd] = directory
+
+        self.__filters = filters
+
+    async def get_changes(self, timeout: float) -> Set[str]:
+        self.__ensure_reader()
+
+        if not self.__changes:
+            self.__event.clear()
+            try:
+                await asyncio.wait_for(self.__event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return set()
+
+            await asyncio.sleep(self.DEBOUNCE_INTERVAL)
+
+        changes = self.__changes
+        self.__changes = set()
+        return changes
+
+    def close(self) -> None:
+        if self.__fd < 0:
+            return
+
+        if self.__reader_loop is not None:
+            self.__reader_loop.remove_reader(self.__fd)
+            self.__reader_loop = None
+
+        os.close(self.__fd)
+        self.__fd = -1
+
+    #
+    # Internals
+    #
+
+    def __ensure_reader(self) -> None:
+        if self.__reader_loop is not None:
+            return
+
+        self.__event = asyncio.Event()
+        self.__reader_loop = asyncio.get_event_loop()
+        self.__reader_loop.add_reader(self.__fd, self.__on_readable)
+
+    def __on_readable(self) -> None:
+        try:
+            data = os.read(self.__fd, self.READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.__logger.exception('__on_readable: failed to read events')
+            return
+
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            directory = self.__directories.get(wd)
+            if directory is None:
+                continue
+
+            #watch was removed by kernel, directory was deleted or moved
+            if mask & self.IN_IGNORED:
+                self.__directories.pop(wd, None)
+                self.__watches.pop(directory, None)
+
+            names = self.__filters.get(directory)
+            if not name or names is None:
+                self.__changes.add(directory if not name else os.path.join(directory, name))
+            elif name in names:
+                self.__changes.add(os.path.join(directory, name))
+
+        if self.__changes:
+            self.__event.set()
@@ -8,13 +8,18 @@ from typing import List
 
 from .wgc_apptype import WgcAppType
 from .wgc_error import MetadataNotFoundError, MetadataParseError
+from .wgc_helper import xml_probe
 from .wgc_metadata import WgcMetadata
+from .wgc_xmlcache import XML_CACHE
 
 class WgcGameInfo:
     '''
     Game game_info.xml file
     '''
 
+    PATH_INSTALLED = 'game/installed'
+    PROBE_PATHS = [PATH_INSTALLED]
+
     @staticmethod 
     def create_file(filepath: str, app_instance, metadata: WgcMetadata, apptype: WgcAppType, localization: str):
         '''
@@ -83,6 +88,8 @@ class WgcGameInfo:
         with open(filepath, "w") as f:
             f.write(minidom.parseString(text).toprettyxml(indent="  "))
 
+        XML_CACHE.invalidate(filepath)
+
 
     def __init__(self, filepath: str):
         self.__filepath = filepath
@@ -90,9 +97,10 @@ class WgcGameInfo:
         if not os.path.exists(self.__filepath):
             raise MetadataNotFoundError("WgcGameInfo/__init__: %s does not exists" % self.__filepath)
 
-        self.__root = None
+        #only required values are read, large part_versions section is not parsed
+        self.__values = None
         try:
-            self.__root = ElementTree.parse(self.__filepath).getroot()
+            self.__values = XML_CACHE.get(self.__filepath, 'gameinfo', lambda path: xml_probe(path, WgcGameInfo.PROBE_PATHS))
         except ElementTree.ParseError:
             raise MetadataParseError("WgcGameInfo/__init__: %s failed to parse" % self.__filepath)        
 
@@ -101,5 +109,4 @@ class WgcGameInfo:
         '''
         checks if game is installed according to game_info.xml
         '''
-        return self.__root.find('game/installed').text == 'true'
-
+        return self.__values.get(self.PATH_INSTALLED) == 'true'
@@ -2,28 +2,45 @@
 # SPDX-License-Identifier: MIT
 
 import logging
-from typing import List
+from typing import FrozenSet, List
 import xml.etree.ElementTree as ElementTree
 
+from .wgc_xmlcache import XML_CACHE
+
 class WGCGameRestrictions():
     def __init__(self, path: str):
         self.__logger = logging.getLogger('WGCGameRestrictions')
     
-        self.__xml = None
+        self.__allowed_ids = None
         try:
-            self.__xml = ElementTree.parse(path).getroot()
+            self.__allowed_ids = XML_CACHE.get(path, 'gamerestrictions', WGCGameRestrictions.__parse)
         except Exception:
             self.__logger.error('__init__: failed to parse file %s' % path)
             pass
 
+    @staticmethod
+    def __parse(path: str) -> FrozenSet[str]:
+        allowed = ElementTree.parse(path).getroot().find('allowed')
+        if allowed is None:
+            return frozenset()
+
+        return frozenset(item.text for item in allowed)
+
     def get_allowed_ids(self) -> List[str]:
         result = list()
 
-        if not self.__xml:
+        if self.__allowed_ids is None:
             self.__logger.warn('get_allowed_id(): object was not initialized properly')
             return result
 
-        for item in self.__xml.find('allowed'):
-            result.append(item.text)
-
+        result.extend(self.__allowed_ids)
         return result
+
+    def get_allowed_ids_set(self) -> FrozenSet[str]:
+        '''
+        returns allowed ids as frozenset, it is shared until the file is changed
+        '''
+        if self.__allowed_ids is None:
+            return frozenset()
+
+        return self.__allowed_ids
@@ -5,6 +5,8 @@ import logging
 import os
 import platform
 import shutil
+import xml.etree.ElementTree as ElementTree
+from typing import Dict, Iterable
 
 from .wgc_constants import USER_PROFILE_URLS
 
@@ -39,6 +41,48 @@ def file_copy(path_source: str, path_destination):
     '''
     shutil.copyfile(path_source, path_destination)
 
+### XML
+
+def xml_probe(filepath: str, paths: Iterable[str]) -> Dict[str, str]:
+    '''
+    returns texts of elements by paths relative to the root element (e.g. `game/installed`)
+
+    file is parsed incrementally, parsing is stopped as soon as all paths were found, missing paths are not returned
+    '''
+    wanted = set(paths)
+    result = dict()
+    if not wanted:
+        return result
+
+    stack = list()
+    root = None
+    with open(filepath, 'rb') as file:
+        for event, element in ElementTree.iterparse(file, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                else:
+                    stack.append(element.tag)
+                continue
+
+            if element is root:
+                break
+
+            path = '/'.join(stack)
+            if path in wanted and path not in result:
+                result[path] = element.text
+                if len(result) == len(wanted):
+                    break
+
+            stack.pop()
+
+            #free processed elements
+            element.clear()
+            if not stack:
+                root.clear()
+
+    return result
+
 ### Names
 
 def fixup_gamename(name):
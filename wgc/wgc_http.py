@@ -1,12 +1,16 @@
 # (c) 2019-2021 Mikhail Paulyshka
 # SPDX-License-Identifier: MIT
 
+import asyncio
 import logging
-from typing import Any
+from typing import Any, Callable, Dict, Tuple
 
-from mglx.mglx_http import MglxHttp
+import aiohttp
 
-from .wgc_constants import WGCRealms
+from mglx.mglx_circuitbreaker import MglxCircuitBreaker
+from mglx.mglx_http import MglxHttp, MglxHttpResponse
+
+from .wgc_constants import HTTP_RATE_LIMITS, PAPI_WGNET_REALMS, PAPI_WOT_REALMS, WGCRealms
 
 class WgcHttp(MglxHttp):
     #
@@ -14,11 +18,42 @@ class WgcHttp(MglxHttp):
     #
 
     HTTP_USER_AGENT = 'wgc/20.01.00.9514'
+
+    CIRCUIT_BREAKER_LTYPES = ['wgcps', 'wguscs']
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3
+    CIRCUIT_BREAKER_RESET_TIMEOUT = 60
+    CIRCUIT_BREAKER_FAILURE_STATUSES = [0, 408, 500, 502, 503, 504]
+
+    HTTP_STATUS_CIRCUIT_OPEN = 503 #503 Service Unavailable
     
-    def __init__(self, verify_ssl = True):
+    def __init__(self, verify_ssl = True, rate_limits: Dict[str, Tuple[float, int]] = None):
         super(WgcHttp, self).__init__(WgcHttp.HTTP_USER_AGENT, verify_ssl = verify_ssl)
         self.__logger = logging.getLogger('wgc_http')
 
+        self.__circuit_breakers = dict()
+        self.__setup_rate_limits(rate_limits)
+
+    def __setup_rate_limits(self, rate_limits: Dict[str, Tuple[float, int]] = None) -> None:
+        limits = dict(HTTP_RATE_LIMITS)
+        if rate_limits:
+            limits.update(rate_limits)
+
+        hosts = dict()
+        for realm in WGCRealms.values():
+            for ltype in ('wgnet', 'wgcps', 'wguscs'):
+                hosts[realm['domain_%s' % ltype]] = ltype
+
+        for papi_realms in (PAPI_WGNET_REALMS, PAPI_WOT_REALMS):
+            for realm in papi_realms.values():
+                hosts[realm['host']] = 'papi'
+
+        for host, ltype in hosts.items():
+            if ltype not in limits or not limits[ltype]:
+                continue
+
+            rate, burst = limits[ltype]
+            self.set_rate_limit(host, rate, burst)
+
     #
     # URL Formatting
     # 
@@ -32,12 +67,72 @@ class WgcHttp(MglxHttp):
             self.__logger.exception('get_url: failed to generate URL for ltype %s and realm %s' % (ltype, realm))
             return None
 
+    #
+    # Circuit breaker
+    #
+
+    def is_available(self, ltype: str, realm: str) -> bool:
+        '''
+        returns False if circuit for given backend is open and requests to it will fail fast
+        '''
+        breaker = self.__circuit_breakers.get((ltype, realm.upper() if realm else realm))
+        if breaker is None:
+            return True
+
+        return not breaker.is_open()
+
+    def __get_circuit_breaker(self, ltype: str, realm: str) -> MglxCircuitBreaker:
+        if ltype not in self.CIRCUIT_BREAKER_LTYPES:
+            return None
+
+        key = (ltype, realm.upper() if realm else realm)
+        if key not in self.__circuit_breakers:
+            self.__circuit_breakers[key] = MglxCircuitBreaker(self.CIRCUIT_BREAKER_FAILURE_THRESHOLD, self.CIRCUIT_BREAKER_RESET_TIMEOUT)
+
+        return self.__circuit_breakers[key]
+
+    async def __request_guarded(self, method: str, ltype: str, realm: str, url: str, **kwargs) -> MglxHttpResponse:
+        breaker = self.__get_circuit_breaker(ltype, realm)
+        if breaker is None:
+            return await self.request(method, self.get_url(ltype, realm, url), **kwargs)
+
+        if not breaker.allow_request():
+            self.__logger.warning('request: [%s]%s/%s%s --> circuit is open' % (method, ltype, realm, url))
+            return MglxHttpResponse(self.HTTP_STATUS_CIRCUIT_OPEN, None)
+
+        #reserved probe must be released on every path, including exceptions escaping the request
+        try:
+            response = await self.request(method, self.get_url(ltype, realm, url), **kwargs)
+        except asyncio.CancelledError:
+            breaker.record_ignored()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            #only network errors count against the backend
+            breaker.record_failure()
+            self.__logger.warning('request: [%s]%s/%s%s --> network error, failure recorded' % (method, ltype, realm, url))
+            raise
+        except Exception:
+            #local errors (e.g. in the chunk handler) say nothing about the backend
+            breaker.record_ignored()
+            raise
+
+        if response.status in self.CIRCUIT_BREAKER_FAILURE_STATUSES:
+            breaker.record_failure()
+            if breaker.get_state() == MglxCircuitBreaker.STATE_OPEN:
+                self.__logger.warning('request: circuit for %s/%s is opened after status %s' % (ltype, realm, response.status))
+        elif response.status == 499:
+            breaker.record_ignored()
+        else:
+            breaker.record_success()
+
+        return response
+
     #
     # Requests
     #
 
-    async def request_get_simple(self, type: str, realm: str, url: str) -> Any:
-        return await self.request('GET', self.get_url(type, realm, url))
+    async def request_get_simple(self, type: str, realm: str, url: str, *, hedge: bool = False, chunk_handler: Callable[[bytes], None] = None) -> Any:
+        return await self.__request_guarded('GET', type, realm, url, hedge = hedge, chunk_handler = chunk_handler)
 
     async def request_post_simple(self, type: str, realm: str, url: str, *, params: Any = None, data: Any = None, json: Any = None) -> Any:
-        return await self.request('POST', self.get_url(type, realm, url), params = params, data = data, json = json)
+        return await self.__request_guarded('POST', type, realm, url, params = params, data = data, json = json)
@@ -7,6 +7,7 @@ from typing import List, Optional
 
 from .wgc_helper import get_platform, DETACHED_PROCESS
 from .wgc_location import WGCLocation
+from .wgc_processes import WgcProcessHandle
 
 class WgcLauncher:
 
@@ -64,17 +65,20 @@ class WgcLauncher:
     #
 
     @staticmethod
-    def launch_app(executable_path: str, executable_arguments: Optional[List[str]] = None) -> bool:
+    def launch_app(executable_path: str, executable_arguments: Optional[List[str]] = None) -> Optional[WgcProcessHandle]:
+        '''
+        starts application, returns handle of the started process or None on failure
+        '''
         if get_platform() == "macos":
             return WgcLauncher.__launch_app_macos(executable_path, executable_arguments)
         elif get_platform() == 'windows':
             return WgcLauncher.__launch_app_windows(executable_path, executable_arguments)
         else:
             logging.getLogger('wgc_launcher').warning('launch_game: unsupported platform (%s)' % (get_platform()))
-            return False
+            return None
 
     @staticmethod
-    def __launch_app_macos(executable_path: str, executable_arguments: Optional[List[str]]) -> bool:
+    def __launch_app_macos(executable_path: str, executable_arguments: Optional[List[str]]) -> WgcProcessHandle:
         args = [
             WGCLocation.get_wgc_wine_macos_path(), '--bottle', 'default', '--wait-children', '--enable-alt-loader', '--macdrv',
             '--workdir', WGCLocation.FALLBACK_DIR_WGC,
@@ -84,14 +88,14 @@ class WgcLauncher:
         if executable_arguments:
             args += executable_arguments
   
-        subprocess.Popen(args, close_fds=True)
-        return True
+        process = subprocess.Popen(args, close_fds=True)
+        return WgcProcessHandle(process.pid)
 
     @staticmethod
-    def __launch_app_windows(executable_path: str, executable_arguments: Optional[List[str]]) -> bool:
+    def __launch_app_windows(executable_path: str, executable_arguments: Optional[List[str]]) -> WgcProcessHandle:
         args = [executable_path]
         if executable_arguments:
             args += executable_arguments
 
-        subprocess.Popen(args, creationflags=DETACHED_PROCESS)
-        return True
+        process = subprocess.Popen(args, creationflags=DETACHED_PROCESS)
+        return WgcProcessHandle(process.pid)
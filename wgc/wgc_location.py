@@ -27,6 +27,9 @@ class WGCLocation():
     WGC_WGCDIR_PREFERENCES = 'preferences.xml'
     WGC_WGCDIR_WGCAPI = 'wgc_api/wgc_api.exe'
 
+    #contents of apps registry files: path -> ((mtime, size), app path)
+    _apps_files_cache = dict()
+
     @staticmethod 
     def fixup_path(fspath: str) -> str:
         '''
@@ -188,13 +191,25 @@ class WGCLocation():
         if not os.path.exists(apploc_dir):
             return apps
 
-        app_files = [item.path for item in scantree(apploc_dir) if item.is_file() ]
-        for app_file in app_files:
-            app_path = None
-            with open(app_file, 'r', encoding="utf-8") as file_content:
-                app_path = file_content.read()
-                apps.append(WGCLocation.fixup_path(app_path))
-
+        apps_files_cache = dict()
+        for item in scantree(apploc_dir):
+            if not item.is_file():
+                continue
+
+            #read registry file only when it was changed
+            stat = item.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            cached = WGCLocation._apps_files_cache.get(item.path)
+            if cached is not None and cached[0] == signature:
+                app_path = cached[1]
+            else:
+                with open(item.path, 'r', encoding="utf-8") as file_content:
+                    app_path = WGCLocation.fixup_path(file_content.read())
+
+            apps_files_cache[item.path] = (signature, app_path)
+            apps.append(app_path)
+
+        WGCLocation._apps_files_cache = apps_files_cache
         return apps
 
     @staticmethod
@@ -4,203 +4,187 @@
 import logging
 import os
 import xml.etree.ElementTree as ElementTree
-from typing import Dict, List
+from types import MappingProxyType
+from typing import List, Mapping, NamedTuple, Tuple
 
 from .wgc_error import MetadataNotFoundError, MetadataParseError
 from .wgc_helper import fixup_gamename
+from .wgc_xmlcache import XML_CACHE
+
+class WgcMetadataSummary(NamedTuple):
+    '''
+    Immutable data of metadata.xml, built once on parse
+    '''
+
+    version: int
+    app_id: str
+    name: str
+    executables: Mapping[str, str]
+    mutex_names: Tuple[str, ...]
+    client_types: Tuple[str, ...]
+    default_client_type: str
+    parts: Mapping[str, Tuple[str, ...]]
+    languages: Tuple[str, ...]
+    default_language: str
+
+    @staticmethod
+    def from_root(root: ElementTree.Element) -> 'WgcMetadataSummary':
+        version = 6 if root.find('predefined_section') is not None else 5
+
+        def find_text(*paths: str) -> str:
+            #returns text of the first found node
+            for path in paths:
+                node = root.find(path)
+                if node is not None:
+                    return node.text
+            return None
+
+        #executables
+        executables = dict()
+        node = root.find('executable_name')
+        if node is not None:
+            executables['windows'] = node.text
+
+        node = root.find('predefined_section/executables')
+        if node is not None:
+            for executable in node:
+                platform = 'windows'
+                if executable.attrib.get('emul') == 'wgc_mac':
+                    platform = 'macos'
+
+                executables[platform] = executable.text
+
+        #client types and parts
+        client_types = None
+        default_client_type = None
+        parts = dict()
+
+        client_types_node = root.find('predefined_section/client_types')
+        if client_types_node is not None:
+            default_client_type = client_types_node.attrib.get('default')
+            client_type_nodes = list(client_types_node)
+        else:
+            default_client_type = find_text('metadata/default_client_type')
+            client_type_node = root.find('metadata/client_type')
+            client_type_nodes = [client_type_node] if client_type_node is not None else None
+
+        if client_type_nodes is not None:
+            client_types = tuple(client_type.attrib['id'] for client_type in client_type_nodes)
+            for client_type in client_type_nodes:
+                client_parts = client_type.find('client_parts')
+                parts[client_type.attrib['id']] = tuple(client_part.attrib['id'] for client_part in client_parts) if client_parts is not None else tuple()
+
+        #languages
+        languages = find_text('predefined_section/supported_languages', 'supported_languages')
+
+        mutex_name = find_text('mutex_name', 'predefined_section/mutex_name')
+        name = find_text('shortcut_name', 'predefined_section/shortcut_name')
+
+        return WgcMetadataSummary(
+            version = version,
+            app_id = find_text('app_id', 'predefined_section/app_id'),
+            name = fixup_gamename(name) if name is not None else None,
+            executables = MappingProxyType(executables),
+            mutex_names = (mutex_name,) if mutex_name is not None else tuple(),
+            client_types = client_types,
+            default_client_type = default_client_type,
+            parts = MappingProxyType(parts),
+            languages = tuple(languages.split(',')) if languages is not None else None,
+            default_language = find_text('predefined_section/default_language', 'default_language'))
+
 
 class WgcMetadata:
     '''
-    Game metadata.xml file
+    Game metadata.xml file, parsed once into the compact summary
     '''
 
+    __slots__ = ('__filepath', '__summary')
+
     def __init__(self, filepath: str):
-        self.__logger = logging.getLogger('wgc_metadata')
         self.__filepath = filepath
 
         if not os.path.exists(self.__filepath):
             raise MetadataNotFoundError("WgcMetadata/__init__: %s does not exists" % self.__filepath)
 
-        self.__root = None
+        self.__summary = XML_CACHE.get(self.__filepath, 'metadata', WgcMetadata.__parse)
+
+    @staticmethod
+    def __parse(filepath: str) -> WgcMetadataSummary:
         try:
-            self.__root = ElementTree.parse(self.__filepath).getroot()
+            root = ElementTree.parse(filepath).getroot()
         except ElementTree.ParseError:
-            raise MetadataParseError("WgcMetadata/__init__: %s failed to parse" % self.__filepath)        
+            raise MetadataParseError("WgcMetadata/__init__: %s failed to parse" % filepath)
+
+        #tree is released after parsing
+        summary = WgcMetadataSummary.from_root(root)
+
+        logger = logging.getLogger('wgc_metadata')
+        if summary.app_id is None:
+            logger.error('__parse: failed to find app id in %s' % filepath)
+        if summary.name is None:
+            logger.error('__parse: failed to find name in %s' % filepath)
+        if not summary.executables:
+            logger.error('__parse: failed to find executables in %s' % filepath)
+
+        return summary
+
+    def get_filepath(self) -> str:
+        return self.__filepath
+
+    def get_summary(self) -> WgcMetadataSummary:
+        return self.__summary
 
     def get_app_id(self) -> str:
         '''
         returns app id from metadata
         '''
-
-        # metadata v5
-        result = self.__root.find('app_id')
-        
-        # metadata v6
-        if result is None:
-            result = self.__root.find('predefined_section/app_id')
-
-        #unknown version
-        if result is None:
-            self.__logger.error('get_app_id: None object')
-            return None
-
-        return result.text
+        return self.__summary.app_id
 
     def get_name(self) -> str:
         '''
         returns game name from metadata
         '''
+        return self.__summary.name
 
-        # metadata v5
-        result = self.__root.find('shortcut_name')
-        
-        # metadata v6
-        if result is None:
-            result = self.__root.find('predefined_section/shortcut_name')
-
-        #unknown version
-        if result is None:
-            self.__logger.error('get_name: None object')
-            return None
-
-        return fixup_gamename(result.text)
-
-    def get_executable_names(self) -> Dict[str,str]:
-        result = dict()
-
-        # metadata v5
-        node = self.__root.find('executable_name')
-        if node is not None:
-            result['windows'] = node.text
-        
-        #metadata v6
-        node = self.__root.find('predefined_section/executables')
-        if node is not None:
-            for executable in node:
-                platform = 'windows'
-                if 'emul' in executable.attrib:
-                    if executable.attrib['emul'] == 'wgc_mac':
-                        platform = 'macos'
-
-                result[platform] = executable.text
-
-        #unknown version
-        if not result:
-            self.__logger.error('get_executable_names: failed to find executables')
+    def get_executable_names(self) -> Mapping[str,str]:
+        '''
+        returns read-only mapping of platform to executable name
+        '''
+        if not self.__summary.executables:
             return None
 
-        return result
+        return self.__summary.executables
 
     def get_mutex_names(self) -> List[str]:
-        result = list()
+        if not self.__summary.mutex_names:
+            logging.getLogger('wgc_metadata').warning('get_mutex_names: no mutexes found for application %s' % self.get_app_id())
 
-        # metadata v5
-        mtx_config = self.__root.find('mutex_name')
-        
-        # metadata v6
-        if mtx_config is None:
-            mtx_config = self.__root.find('predefined_section/mutex_name')
-
-        if mtx_config is not None:
-            result.append(mtx_config.text)
-
-        #unknown version
-        if not result:
-            self.__logger.warning('get_mutex_names: no mutexes found for application %s' % self.get_app_id())
-
-        return result
+        return list(self.__summary.mutex_names)
 
     def get_client_types(self) -> List[str]:
-        # metadata v6
-        client_types = self.__root.find('predefined_section/client_types')
-        if client_types is not None:
-            result = list()
-
-            for client_type in client_types:
-                result.append(client_type.attrib['id'])
-
-            return result
-
-        # metadata v5
-        client_types = self.__root.find('metadata/client_type')
-        if client_types is not None:
-            result = list()
-            result.append(client_types.attrib['id'])
-            return result
-
-        return None
+        if self.__summary.client_types is None:
+            return None
 
+        return list(self.__summary.client_types)
 
     def get_default_client_type(self) -> str:
-        # metadata v6
-        client_types = self.__root.find('predefined_section/client_types')
-        if client_types is not None:
-            return client_types.attrib['default']
-
-        # metadata v5
-        client_types = self.__root.find('metadata/default_client_type')
-        if client_types is not None:
-            return client_types.text
-
-        return None
+        return self.__summary.default_client_type
 
     def get_parts_ids(self, client_type_id: str) -> List[str]:
+        if self.__summary.client_types is None:
+            return None
 
-        # metadata v6
-        client_types = self.__root.find('predefined_section/client_types')
-        if client_types is not None:
-            result = list()
-
-            for client_type in client_types:
-                if client_type.attrib['id'] != client_type_id:
-                    continue
-                
-                client_parts = client_type.find('client_parts')
-                for client_part in client_parts:
-                    result.append(client_part.attrib['id'])
-
-            return result
-
-        # metadata v5
-        client_types = self.__root.find('metadata/client_type')
-        if client_types is not None:
-            result = list()
-
-            if client_types.attrib['id'] != client_type_id:
-                return None
-            
-            client_parts = client_types.find('client_parts')
-            for client_part in client_parts:
-                result.append(client_part.attrib['id'])
-
-            return result
-
-        return None
+        if client_type_id not in self.__summary.parts:
+            # metadata v5 contains single client type
+            return None if self.__summary.version == 5 else list()
 
+        return list(self.__summary.parts[client_type_id])
 
     def get_languages(self) -> List[str]:
-        # metadata v6
-        languages = self.__root.find('predefined_section/supported_languages')
-        if languages is not None:
-            return languages.text.split(',')
-
-        # metadata v5
-        languages = self.__root.find('supported_languages')
-        if languages is not None:
-            return languages.text.split(',')
-
-        return None
+        if self.__summary.languages is None:
+            return None
 
+        return list(self.__summary.languages)
 
     def get_default_language(self) -> str:
-        # metadata v6
-        language =  self.__root.find('predefined_section/default_language')
-        if language is not None:
-            return language.text
-
-        # metadata v5
-        language =  self.__root.find('default_language')
-        if language is not None:
-            return language.text
-
-        return None
+        return self.__summary.default_language
@@ -0,0 +1,192 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict
+
+class WgcMetadataCacheWriter:
+    '''
+    Streams downloaded metadata into temporary file of the cache
+    '''
+
+    def __init__(self, cache: 'WgcMetadataCache', key: str):
+        self.__cache = cache
+        self.__key = key
+        self.__file = None
+
+    def write(self, chunk: bytes) -> None:
+        if self.__file is None:
+            self.__file = tempfile.NamedTemporaryFile(dir = self.__cache.get_directory(), suffix = '.tmp', delete = False)
+
+        self.__file.write(chunk)
+
+    def commit(self, headers: Any = None) -> str:
+        '''
+        moves downloaded file into the cache, returns path to the cached file
+        '''
+        if self.__file is None:
+            self.write(b'')
+
+        self.__file.close()
+        path = self.__cache.store(self.__key, self.__file.name, headers)
+        self.__file = None
+        return path
+
+    def discard(self) -> None:
+        if self.__file is None:
+            return
+
+        self.__file.close()
+        try:
+            os.remove(self.__file.name)
+        except OSError:
+            pass
+        self.__file = None
+
+
+class WgcMetadataCache:
+    '''
+    On-disk cache of application metadata.xml files
+
+    Files are addressed by hash of (update server, app id), validators (ETag/Last-Modified) are stored in sidecar files,
+    least recently used files are evicted when cache size exceeds `max_size`
+    '''
+
+    DEFAULT_MAX_SIZE = 32 * 1024 * 1024
+
+    EXTENSION_DATA = '.xml'
+    EXTENSION_INFO = '.json'
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.__logger = logging.getLogger('wgc_metadatacache')
+
+        self.__directory = directory
+        self.__max_size = max_size
+
+        try:
+            os.makedirs(self.__directory, exist_ok=True)
+        except OSError:
+            self.__logger.warning('__init__: failed to create cache directory %s' % self.__directory)
+
+    def get_directory(self) -> str:
+        return self.__directory
+
+    @staticmethod
+    def get_key(update_server: str, app_id: str) -> str:
+        return hashlib.sha1(('%s|%s' % (update_server, app_id)).encode('utf-8')).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        '''
+        returns path to the cached file or None if it is not cached
+        '''
+        path = os.path.join(self.__directory, key + self.EXTENSION_DATA)
+        if not os.path.exists(path):
+            return None
+
+        return path
+
+    def get_validators(self, key: str) -> Dict[str, str]:
+        '''
+        returns headers for conditional request of the cached file
+        '''
+        headers = dict()
+        if self.get_path(key) is None:
+            return headers
+
+        info = self.__read_info(key)
+        if 'etag' in info:
+            headers['If-None-Match'] = info['etag']
+        if 'last_modified' in info:
+            headers['If-Modified-Since'] = info['last_modified']
+
+        return headers
+
+    def create_writer(self, key: str) -> WgcMetadataCacheWriter:
+        return WgcMetadataCacheWriter(self, key)
+
+    def touch(self, key: str) -> str:
+        '''
+        marks cached file as recently used, returns path to it
+        '''
+        path = self.get_path(key)
+        if path is not None:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+        return path
+
+    def store(self, key: str, source_path: str, headers: Any = None) -> str:
+        path = os.path.join(self.__directory, key + self.EXTENSION_DATA)
+        os.replace(source_path, path)
+
+        info = dict()
+        if headers is not None:
+            if 'ETag' in headers:
+                info['etag'] = headers['ETag']
+            if 'Last-Modified' in headers:
+                info['last_modified'] = headers['Last-Modified']
+        self.__write_info(key, info)
+
+        self.__evict(path)
+        return path
+
+    def remove(self, key: str) -> None:
+        for extension in (self.EXTENSION_DATA, self.EXTENSION_INFO):
+            try:
+                os.remove(os.path.join(self.__directory, key + extension))
+            except OSError:
+                pass
+
+    #
+    # Internals
+    #
+
+    def __read_info(self, key: str) -> Dict[str, str]:
+        try:
+            with open(os.path.join(self.__directory, key + self.EXTENSION_INFO), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return dict()
+
+    def __write_info(self, key: str, info: Dict[str, str]) -> None:
+        try:
+            with open(os.path.join(self.__directory, key + self.EXTENSION_INFO), 'w') as f:
+                json.dump(info, f)
+        except OSError:
+            self.__logger.warning('__write_info: failed to write info for %s' % key)
+
+    def __evict(self, keep_path: str) -> None:
+        '''
+        removes least recently used files until cache fits into the size limit
+        '''
+        entries = list()
+        total_size = 0
+
+        try:
+            for entry in os.scandir(self.__directory):
+                if not entry.name.endswith(self.EXTENSION_DATA) or not entry.is_file():
+                    continue
+
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+        except OSError:
+            self.__logger.warning('__evict: failed to scan cache directory %s' % self.__directory)
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.__max_size:
+                break
+
+            if path == keep_path:
+                continue
+
+            self.remove(os.path.basename(path)[:-len(self.EXTENSION_DATA)])
+            total_size -= size
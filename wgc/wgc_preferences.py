@@ -1,6 +1,7 @@
 # (c) 2019-2020 Mikhail Paulyshka
 # SPDX-License-Identifier: MIT
 
+import copy
 import logging
 import os
 import xml.etree.ElementTree as ElementTree
@@ -9,6 +10,7 @@ from xml.dom import minidom
 from .wgc_constants import FALLBACK_COUNTRY, FALLBACK_LANGUAGE
 from .wgc_error import MetadataNotFoundError\
     
+from .wgc_xmlcache import XML_CACHE
 
 class WgcPreferences:
     '''
@@ -22,19 +24,29 @@ class WgcPreferences:
 
         self.__filepath = filepath
         self.__root = None
+        #parsed tree is shared through the XML cache and copied on the first modification
+        self.__root_shared = False
 
         if os.path.exists(filepath):
-            self.__root = ElementTree.parse(filepath).getroot()
+            self.__root = XML_CACHE.get(filepath, 'preferences', lambda path: ElementTree.parse(path).getroot())
+            self.__root_shared = True
         else:
             self.__logger.warning('__init__: %s is not exists' % filepath)
 
+    def __get_writable_root(self) -> ElementTree.Element:
+        if self.__root_shared:
+            self.__root = copy.deepcopy(self.__root)
+            self.__root_shared = False
+
+        return self.__root
+
 
     def register_app_dir(self, app_dir) -> bool:
         if not self.__root:
             self.__logger.error('register_app_dir: failed to register app because %s does not exists' % self.__filepath)
             return False
 
-        games = self.__root.find('application/games_manager/games')
+        games = self.__get_writable_root().find('application/games_manager/games')
         if games is None:
             self.__logger.error('register_app_dir: failed to games section')
             return False
@@ -83,7 +95,7 @@ class WgcPreferences:
             self.__logger.error('set_active_game: failed to set active game because %s does not exists' % self.__filepath)
             return False
 
-        gm = self.__root.find('application/games_manager')
+        gm = self.__get_writable_root().find('application/games_manager')
         if not gm:
             self.__logger.error('set_active_game: failed to find game manager')
 
@@ -101,7 +113,7 @@ class WgcPreferences:
             self.__logger.error('set_current_game: failed to set current game because %s does not exists' % self.__filepath)
             return False
 
-        gm = self.__root.find('application/games_manager')
+        gm = self.__get_writable_root().find('application/games_manager')
         if not gm:
             self.__logger.error('set_current_game: failed to find game manager')
 
@@ -123,4 +135,5 @@ class WgcPreferences:
         with open(self.__filepath, "w") as f:
             f.write(minidom.parseString(text).toprettyxml(indent="  "))
 
+        XML_CACHE.invalidate(self.__filepath)
         return True
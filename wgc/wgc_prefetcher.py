@@ -0,0 +1,57 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import logging
+from typing import Iterable
+
+from .wgc_api import WgcApi
+from .wgc_application_owned import WGCOwnedApplicationInstance
+
+class WgcMetadataPrefetcher:
+    '''
+    Downloads and parses metadata of owned applications in background, so the install does not wait for it
+    '''
+
+    MAX_CONCURRENCY = 2
+    DELAY_BETWEEN_ITEMS = 1.0
+
+    def __init__(self, api: WgcApi):
+        self.__logger = logging.getLogger('wgc_prefetcher')
+
+        self.__api = api
+        self.__task = None
+
+    def start(self, instances: Iterable[WGCOwnedApplicationInstance]) -> None:
+        '''
+        starts prefetching of given instances, previous prefetch is cancelled
+        '''
+        self.stop()
+        self.__task = asyncio.ensure_future(self.__worker(list(instances)))
+
+    def stop(self) -> None:
+        if self.__task is not None and not self.__task.done():
+            self.__task.cancel()
+
+        self.__task = None
+
+    async def shutdown(self) -> None:
+        self.stop()
+
+    async def __worker(self, instances) -> None:
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+
+        async def prefetch(instance: WGCOwnedApplicationInstance) -> None:
+            async with semaphore:
+                try:
+                    await self.__api.get_app_metadata(instance.get_update_service_url(), instance.get_application_id())
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    self.__logger.exception('prefetch: failed to prefetch metadata for %s' % instance.get_application_id())
+
+                #yield bandwidth to the foreground requests
+                await asyncio.sleep(self.DELAY_BETWEEN_ITEMS)
+
+        await asyncio.gather(*[prefetch(instance) for instance in instances])
+        self.__logger.info('__worker: metadata prefetch finished for %s applications' % len(instances))
@@ -0,0 +1,347 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Set
+
+import psutil
+
+class WgcProcessHandle():
+    '''
+    Process started by the plugin, identified by pid and create time
+
+    Descendants are tracked too, so the handle stays alive when the launcher re-spawns the real game process and exits.
+    Children are matched by parent pid, which is kept after the parent exit on Windows, so they are adopted by
+    WgcProcessWatcher and by the handle itself even if the launcher has already exited.
+    '''
+
+    #blocking wait in executor is interrupted periodically, so cancelled waits release the thread
+    WAIT_TIMEOUT = 5.0
+    #launchers re-spawn the game shortly after start, descendants are rescanned with this interval during launch period only
+    LAUNCH_RESCAN_INTERVAL = 0.5
+    LAUNCH_PERIOD = 30.0
+
+    def __init__(self, pid: int):
+        self.__lock = threading.Lock()
+
+        #pid -> create time of the tracked processes
+        self.__processes = dict()
+        #pid -> create time of all processes which were tracked, children of them are adopted
+        self.__parents = dict()
+        try:
+            create_time = psutil.Process(pid).create_time()
+            self.__processes[pid] = create_time
+            self.__parents[pid] = create_time
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            pass
+
+    def adopt(self, pid: int, ppid: int, create_time: float) -> bool:
+        '''
+        tracks the process if it was spawned by the process which is or was tracked, returns True if it was adopted
+        '''
+        with self.__lock:
+            parent_create_time = self.__parents.get(ppid)
+            if parent_create_time is None or create_time < parent_create_time or pid in self.__processes:
+                return False
+
+            self.__processes[pid] = create_time
+            self.__parents[pid] = create_time
+            return True
+
+    async def wait(self) -> None:
+        '''
+        waits until the process and all its descendants exit, process table is never walked on the event loop
+        '''
+        loop = asyncio.get_event_loop()
+        launch_deadline = time.monotonic() + self.LAUNCH_PERIOD
+
+        while True:
+            rescan = time.monotonic() < launch_deadline
+            processes = await loop.run_in_executor(None, self.__get_processes, rescan)
+            if not processes:
+                #processes adopted by the watcher in the meantime are checked on the next iteration
+                if not self.__processes:
+                    return
+                continue
+
+            timeout = self.LAUNCH_RESCAN_INTERVAL if rescan else self.WAIT_TIMEOUT
+            await loop.run_in_executor(None, psutil.wait_procs, processes, timeout)
+
+    def __get_processes(self, rescan: bool) -> List[psutil.Process]:
+        '''
+        returns alive tracked processes, with `rescan` newly spawned descendants are added to the tracked ones,
+        orphaned children are looked up by parent pid when no tracked process is alive
+        '''
+        with self.__lock:
+            tracked = dict(self.__processes)
+
+        processes = dict()
+        for pid, create_time in tracked.items():
+            try:
+                process = psutil.Process(pid)
+                if process.create_time() != create_time or not self.__is_running(process):
+                    continue
+
+                processes[pid] = process
+                if not rescan:
+                    continue
+
+                for child in process.children(recursive=True):
+                    if child.pid not in processes and child.pid not in tracked:
+                        processes[child.pid] = child
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+
+        if not processes:
+            processes = self.__find_orphans()
+
+        alive = dict()
+        for pid, process in list(processes.items()):
+            try:
+                alive[pid] = process.create_time()
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                del processes[pid]
+
+        with self.__lock:
+            #keep processes which were adopted while the lookup was running
+            for pid, create_time in self.__processes.items():
+                if pid not in tracked:
+                    alive.setdefault(pid, create_time)
+
+            for pid, create_time in alive.items():
+                self.__parents.setdefault(pid, create_time)
+            self.__processes = alive
+
+        return list(processes.values())
+
+    def __find_orphans(self) -> Dict[int, psutil.Process]:
+        '''
+        returns alive processes which were spawned by the tracked processes, but were not adopted yet
+        '''
+        with self.__lock:
+            parents = dict(self.__parents)
+
+        orphans = dict()
+        for process in psutil.process_iter(['ppid', 'create_time']):
+            parent_create_time = parents.get(process.info['ppid'])
+            create_time = process.info['create_time']
+            if parent_create_time is None or create_time is None or create_time < parent_create_time:
+                continue
+
+            if process.pid in parents or not self.__is_running(process):
+                continue
+
+            orphans[process.pid] = process
+
+        return orphans
+
+    @staticmethod
+    def __is_running(process: psutil.Process) -> bool:
+        try:
+            return process.status() != psutil.STATUS_ZOMBIE
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return False
+
+
+class WgcProcessIndex():
+    '''
+    Snapshot of running processes indexed by normalized executable paths
+    '''
+
+    #wine processes are named after the wine binaries, so they can not be filtered by executable name
+    WINE_PROCESS_MARKER = 'wine'
+    WINE_WRAPPER = 'winewrapper.exe'
+
+    def __init__(self):
+        self.__paths = dict()
+
+    @staticmethod
+    def normalize_path(path: str) -> str:
+        return path.lower().replace('\\','/')
+
+    @staticmethod
+    def get_process_names(paths: Iterable[str]) -> Set[str]:
+        '''
+        returns set of process names for the given executable paths
+        '''
+        return set(os.path.basename(WgcProcessIndex.normalize_path(path)) for path in paths if path)
+
+    @staticmethod
+    def is_candidate(name: str, names: Set[str] = None) -> bool:
+        '''
+        cheap check which skips processes which can not be a game
+        '''
+        if names is None:
+            return True
+
+        if not name:
+            return False
+
+        name = name.lower()
+        return name in names or WgcProcessIndex.WINE_PROCESS_MARKER in name
+
+    @staticmethod
+    def get_process_paths(process: psutil.Process) -> List[str]:
+        '''
+        returns normalized exe path and wine wrapper command line paths of the process
+        '''
+        result = list()
+
+        with process.oneshot():
+            proc_exe = process.exe()
+            if not proc_exe:
+                return result
+            result.append(WgcProcessIndex.normalize_path(proc_exe))
+
+            proc_cmdline = process.cmdline()
+            if proc_cmdline and len(proc_cmdline) > 1 and proc_cmdline[0] == WgcProcessIndex.WINE_WRAPPER:
+                result.extend([WgcProcessIndex.normalize_path(i) for i in proc_cmdline])
+
+        return result
+
+    @staticmethod
+    def create(names: Set[str] = None) -> 'WgcProcessIndex':
+        '''
+        builds snapshot of processes, only processes with given names (or wine ones) are inspected
+        '''
+        index = WgcProcessIndex()
+
+        for proc in psutil.process_iter(['name']):
+            if not WgcProcessIndex.is_candidate(proc.info['name'], names):
+                continue
+
+            try:
+                index.add(proc.pid, WgcProcessIndex.get_process_paths(proc))
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+
+        return index
+
+    def add(self, pid: int, paths: Iterable[str]) -> None:
+        for path in paths:
+            self.__paths.setdefault(path, set()).add(pid)
+
+    def remove(self, pid: int) -> None:
+        for path in list(self.__paths.keys()):
+            pids = self.__paths[path]
+            pids.discard(pid)
+            if not pids:
+                del self.__paths[path]
+
+    def contains(self, path: str) -> bool:
+        return self.normalize_path(path) in self.__paths
+
+    def is_running(self, paths: Iterable[str]) -> bool:
+        '''
+        checks if any of given executable paths is running
+        '''
+        for path in paths:
+            if path and self.contains(path):
+                return True
+
+        return False
+
+
+class WgcProcessWatcher():
+    '''
+    Keeps process index up to date by inspecting only processes which were started or changed since the previous poll
+    '''
+
+    def __init__(self):
+        self.__names = None
+        self.__index = WgcProcessIndex()
+
+        #pid -> (create time, name), for all seen processes
+        self.__pids = dict()
+        #pid -> create time, for indexed processes
+        self.__tracked_pids = dict()
+        #handles of the launched processes, they adopt spawned children
+        self.__handles = set()
+
+    def get_index(self) -> WgcProcessIndex:
+        return self.__index
+
+    def set_names(self, names: Set[str]) -> None:
+        '''
+        sets process names of interest, all processes are inspected again on next poll if names were changed
+        '''
+        if names == self.__names:
+            return
+
+        self.__names = set(names)
+        self.reset()
+
+    def add_handle(self, handle: WgcProcessHandle) -> None:
+        self.__handles.add(handle)
+
+    def remove_handle(self, handle: WgcProcessHandle) -> None:
+        self.__handles.discard(handle)
+
+    def reset(self) -> None:
+        self.__index = WgcProcessIndex()
+        self.__pids = dict()
+        self.__tracked_pids = dict()
+
+    def poll(self, full: bool = False) -> bool:
+        '''
+        updates process index, returns True if it was changed
+
+        Only name and create time are read for all processes, executable paths are inspected for the new processes
+        and for the ones which pid was reused or which executed another image (name was changed).
+        `full` inspects all processes again.
+        '''
+        changed = False
+        if full:
+            changed = len(self.__tracked_pids) > 0
+            self.reset()
+
+        current_pids = dict()
+        for proc in psutil.process_iter(['name', 'create_time']):
+            current_pids[proc.pid] = (proc, (proc.info['create_time'], proc.info['name']))
+
+        #exited processes
+        for pid in list(self.__pids.keys()):
+            if pid not in current_pids:
+                del self.__pids[pid]
+                changed = self.__untrack(pid) or changed
+
+        #new processes, reused pids and changed images
+        for pid, (proc, signature) in current_pids.items():
+            if self.__pids.get(pid) == signature:
+                continue
+
+            changed = self.__untrack(pid) or changed
+            self.__pids[pid] = signature
+
+            (create_time, name) = signature
+            try:
+                if self.__handles and create_time is not None:
+                    ppid = proc.ppid()
+                    for handle in self.__handles:
+                        handle.adopt(pid, ppid, create_time)
+
+                if not WgcProcessIndex.is_candidate(name, self.__names):
+                    continue
+
+                paths = WgcProcessIndex.get_process_paths(proc)
+                if not paths:
+                    continue
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+
+            self.__index.add(pid, paths)
+            self.__tracked_pids[pid] = create_time
+            changed = True
+
+        return changed
+
+    def __untrack(self, pid: int) -> bool:
+        if pid not in self.__tracked_pids:
+            return False
+
+        del self.__tracked_pids[pid]
+        self.__index.remove(pid)
+        return True
@@ -0,0 +1,225 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+class WgcSizeCalculator():
+    '''
+    Calculates size of directory trees off the event loop
+
+    Directories are scanned with os.scandir in thread pool, file sizes are taken from DirEntry stat data.
+    Files with several hardlinks are counted once.
+
+    Results of directory scans are cached by directory mtime, so only changed subtrees are scanned again.
+    Directory mtime is not changed when file in it is modified in-place, so cache of the tree should be invalidated on game update.
+    Signatures of the tree roots are persisted with the cache to detect updates which were made while the plugin was not running.
+    '''
+
+    MAX_WORKERS = 4
+    CACHE_VERSION = 2
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.__logger = logging.getLogger('wgc_size')
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wgc_size')
+
+        #directory path -> (mtime, size of files, subdirectory names, hardlinked files)
+        self.__cache = dict()
+        #tree root path -> signature of the root
+        self.__roots = dict()
+        self.__cache_lock = threading.Lock()
+        self.__cache_modified = False
+
+    async def get_size(self, path: str) -> int:
+        '''
+        returns size of the directory tree, walk is stopped when the coroutine is cancelled
+        '''
+        cancel_event = threading.Event()
+        try:
+            return await asyncio.get_event_loop().run_in_executor(None, self.__calculate, path, cancel_event)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
+    def shutdown(self) -> None:
+        self.__executor.shutdown(wait=False)
+
+    #
+    # Cache
+    #
+
+    def invalidate(self, path: str) -> None:
+        '''
+        drops cached data of the directory tree
+        '''
+        with self.__cache_lock:
+            self.__invalidate(path)
+            for root in [root for root in self.__roots if self.__is_subpath(root, path)]:
+                del self.__roots[root]
+                self.__cache_modified = True
+
+    def set_root_signature(self, path: str, signature: Any) -> None:
+        '''
+        sets JSON serializable signature of the tree root, cached data of the tree is dropped when the signature was changed
+        '''
+        signature = self.__normalize_signature(signature)
+
+        with self.__cache_lock:
+            if path in self.__roots and self.__roots[path] == signature:
+                return
+
+            #tree without known signature may be left from the other version of the files too
+            if path in self.__roots or any(self.__is_subpath(cached_path, path) for cached_path in self.__cache):
+                self.__logger.info('set_root_signature: signature of %s was changed, dropping cached data' % path)
+                self.__invalidate(path)
+
+            self.__roots[path] = signature
+            self.__cache_modified = True
+
+    def is_cache_modified(self) -> bool:
+        return self.__cache_modified
+
+    def get_cache_data(self) -> Dict[str, Any]:
+        '''
+        returns JSON serializable cache data
+        '''
+        with self.__cache_lock:
+            self.__cache_modified = False
+            return {
+                'version': self.CACHE_VERSION,
+                'roots': dict(self.__roots),
+                'entries': {path: [mtime, size, subdirs, [[key[0], key[1], link_size] for key, link_size in links]] for path, (mtime, size, subdirs, links) in self.__cache.items()}
+            }
+
+    def set_cache_data(self, data: Dict[str, Any]) -> None:
+        if not isinstance(data, dict) or data.get('version') != self.CACHE_VERSION:
+            return
+
+        cache = dict()
+        try:
+            roots = dict(data['roots'])
+            for path, (mtime, size, subdirs, links) in data['entries'].items():
+                cache[path] = (mtime, size, list(subdirs), [((link[0], link[1]), link[2]) for link in links])
+        except (KeyError, TypeError, ValueError, IndexError):
+            self.__logger.warning('set_cache_data: invalid cache data')
+            return
+
+        with self.__cache_lock:
+            #signatures which were set before loading are compared on the next set_root_signature call
+            self.__cache = cache
+            self.__roots = roots
+            self.__cache_modified = False
+
+    #
+    # Internals
+    #
+
+    def __invalidate(self, path: str) -> None:
+        for cached_path in [cached_path for cached_path in self.__cache if self.__is_subpath(cached_path, path)]:
+            del self.__cache[cached_path]
+            self.__cache_modified = True
+
+    @staticmethod
+    def __normalize_signature(signature: Any) -> Any:
+        '''
+        converts tuples to lists, so signature is equal to the one loaded from JSON
+        '''
+        if isinstance(signature, (list, tuple)):
+            return [WgcSizeCalculator.__normalize_signature(item) for item in signature]
+
+        return signature
+
+    def __calculate(self, path: str, cancel_event: threading.Event) -> int:
+        total_size = 0
+        hardlinks = set()
+        visited = set()
+
+        futures = {self.__executor.submit(self.__scan_directory, path, cancel_event)}
+        try:
+            while futures:
+                done, futures = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                if cancel_event.is_set():
+                    return total_size
+
+                for future in done:
+                    directory, size, subdirs, links = future.result()
+                    visited.add(directory)
+                    total_size += size
+
+                    for key, link_size in links:
+                        if key not in hardlinks:
+                            hardlinks.add(key)
+                            total_size += link_size
+
+                    for subdir in subdirs:
+                        futures.add(self.__executor.submit(self.__scan_directory, subdir, cancel_event))
+        finally:
+            for future in futures:
+                future.cancel()
+
+        #drop entries of removed directories
+        with self.__cache_lock:
+            for cached_path in [cached_path for cached_path in self.__cache if cached_path not in visited and self.__is_subpath(cached_path, path)]:
+                del self.__cache[cached_path]
+                self.__cache_modified = True
+
+        return total_size
+
+    def __scan_directory(self, path: str, cancel_event: threading.Event) -> Tuple[str, int, List[str], List[Tuple]]:
+        '''
+        returns path, size of regular files, subdirectories and hardlinked files of the directory
+        '''
+        if cancel_event.is_set():
+            return path, 0, list(), list()
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.__logger.warning('__scan_directory: failed to stat %s' % path)
+            return path, 0, list(), list()
+
+        with self.__cache_lock:
+            cached = self.__cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return path, cached[1], [os.path.join(path, subdir) for subdir in cached[2]], cached[3]
+
+        size = 0
+        subdirs = list()
+        links = list()
+
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                            continue
+
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+
+                        #cached on Windows, single lstat on POSIX
+                        stat = entry.stat(follow_symlinks=False)
+                        if stat.st_nlink > 1:
+                            links.append(((stat.st_dev, stat.st_ino), stat.st_size))
+                        else:
+                            size += stat.st_size
+                    except OSError:
+                        continue
+        except OSError:
+            self.__logger.warning('__scan_directory: failed to scan %s' % path)
+            return path, size, list(), links
+
+        with self.__cache_lock:
+            self.__cache[path] = (mtime, size, subdirs, links)
+            self.__cache_modified = True
+
+        return path, size, [os.path.join(path, subdir) for subdir in subdirs], links
+
+    @staticmethod
+    def __is_subpath(path: str, root: str) -> bool:
+        return path == root or path.startswith(root.rstrip('\\/') + os.sep) or path.startswith(root.rstrip('\\/') + '/')
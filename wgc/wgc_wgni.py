@@ -6,7 +6,7 @@ import json
 import logging
 import random
 import string
-from typing import Dict, Tuple
+from typing import Callable, Dict, Tuple
 
 from .wgc_constants import WGCAuthorizationResult, WGCRealms
 from .wgc_http import WgcHttp
@@ -34,6 +34,8 @@ class WgcWgni:
 
         self.__login_info = None
         self.__login_info_temp = None
+
+        self.__login_handlers = list()
  
     async def shutdown(self):
         pass
@@ -87,6 +89,19 @@ class WgcWgni:
         return self.__login_info['realm']
 
 
+    def add_login_handler(self, handler: Callable[[], None]) -> None:
+        '''
+        registers handler which is called right after successful login
+        '''
+        self.__login_handlers.append(handler)
+
+    def __notify_login(self) -> None:
+        for handler in self.__login_handlers:
+            try:
+                handler()
+            except Exception:
+                self.__logger.exception('__notify_login: login handler failed')
+
     def login_info_get(self) -> Dict[str,str]:
         return self.__login_info
 
@@ -129,6 +144,7 @@ class WgcWgni:
             self.__logger.error('login_info_set: SPA ID missmatch')
             return False
         
+        self.__notify_login()
         return True
 
     #
@@ -310,6 +326,7 @@ class WgcWgni:
         else:
             self.__logger.warning('do_auth_token: __request_account_info returns None')
 
+        self.__notify_login()
         return WGCAuthorizationResult.FINISHED
 
 
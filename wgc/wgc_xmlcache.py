@@ -0,0 +1,86 @@
+# (c) 2019-2021 Mikhail Paulyshka
+# SPDX-License-Identifier: MIT
+
+import collections
+import os
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+class WgcXmlCache():
+    '''
+    Cache of values parsed from XML files, keyed by (path, mtime, size)
+
+    Different consumers keep different data of the same file, so entries are distinguished by `kind` too.
+    Cached values are shared and must not be mutated by consumers.
+    '''
+
+    DEFAULT_MAX_ENTRIES = 128
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.__max_entries = max_entries
+        #(path, kind) -> (signature, value)
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+        self.__hits = 0
+        self.__misses = 0
+
+    @staticmethod
+    def get_signature(path: str) -> Tuple[int, int]:
+        '''
+        returns (mtime, size) of the file or None if it does not exist
+        '''
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def get(self, path: str, kind: str, parser: Callable[[str], Any]) -> Any:
+        '''
+        returns cached value or parses file with `parser` when it was changed, parser exceptions are not cached
+        '''
+        key = (os.path.normcase(os.path.abspath(path)), kind)
+        signature = self.get_signature(path)
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if signature is not None and entry is not None and entry[0] == signature:
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return entry[1]
+
+            self.__misses += 1
+
+        value = parser(path)
+        if signature is None:
+            return value
+
+        with self.__lock:
+            self.__entries[key] = (signature, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+        return value
+
+    def invalidate(self, path: str) -> None:
+        '''
+        drops all entries of the file, should be called after the file was written
+        '''
+        path = os.path.normcase(os.path.abspath(path))
+        with self.__lock:
+            for key in [key for key in self.__entries if key[0] == path]:
+                del self.__entries[key]
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {'hits': self.__hits, 'misses': self.__misses, 'entries': len(self.__entries)}
+
+
+#cache shared by all XML file readers
+XML_CACHE = WgcXmlCache()